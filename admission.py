@@ -0,0 +1,164 @@
+"""
+Контроль приёма задач (admission control) и оценка ожидания.
+
+Глубина очереди — длина списка Celery в Redis-брокере, ёмкость — число слотов
+воркеров (WORKER_SLOTS) и скользящее среднее длительности задачи. Сверх
+ADMISSION_MAX_QUEUE задач в очереди (check_queue, до чтения загрузки), а также
+сверх квот клиента (CLIENT_MAX_ACTIVE активных, CLIENT_MAX_PER_HOUR в час)
+POST /jobs отвечает 429 с оценкой Retry-After. Пачку, которая больше самой
+квоты или очереди, не примут никогда — на неё 413 без Retry-After.
+
+Квоты клиента проверяет и списывает admit() одной транзакцией (WATCH/MULTI):
+параллельные загрузки одного клиента не проскочат лимит. Вызывается после
+дедупликации — повторная загрузка уже идущей или готовой задачи квоту не тратит.
+
+Клиент — адрес соединения (за прокси — uvicorn --proxy-headers).
+Заголовку X-Client-Id верим только при TRUST_CLIENT_ID_HEADER=1, когда его
+выставляет аутентифицирующий прокси: иначе любой обходит квоты, меняя заголовок.
+"""
+import os
+import math
+import time
+from dataclasses import dataclass
+
+import redis
+from dotenv import load_dotenv
+
+from storage import r
+
+load_dotenv()
+
+CELERY_QUEUE = os.getenv("CELERY_QUEUE", "celery")
+WORKER_SLOTS = int(os.getenv("WORKER_SLOTS", "4"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "200"))
+CLIENT_MAX_ACTIVE = int(os.getenv("CLIENT_MAX_ACTIVE", "20"))
+CLIENT_MAX_PER_HOUR = int(os.getenv("CLIENT_MAX_PER_HOUR", "200"))
+TRUST_CLIENT_ID_HEADER = os.getenv("TRUST_CLIENT_ID_HEADER", "0").strip().lower() in ("1", "true", "yes")
+# оценка длительности задачи, пока нет статистики
+DEFAULT_JOB_SECONDS = float(os.getenv("DEFAULT_JOB_SECONDS", "120"))
+# задачи клиента старше этого не считаются активными (защита от «зависших» счётчиков)
+CLIENT_ACTIVE_TTL = int(os.getenv("CLIENT_ACTIVE_TTL", "21600"))
+
+JOB_SECONDS_KEY = "stats:job_seconds_ewma"
+EWMA_ALPHA = 0.1
+MAX_RETRY_AFTER = 3600
+
+
+@dataclass
+class Decision:
+    admitted: bool
+    reason: str = ""
+    retry_after: int = 0
+    queue_depth: int = 0
+    eta_seconds: float = 0.0
+    # False — запрос не пройдёт никогда (пачка больше квоты), повторять бессмысленно
+    retryable: bool = True
+
+
+def queue_depth() -> int:
+    return r.llen(CELERY_QUEUE)
+
+
+def avg_job_seconds() -> float:
+    raw = r.get(JOB_SECONDS_KEY)
+    return float(raw) if raw else DEFAULT_JOB_SECONDS
+
+
+def record_job_seconds(seconds: float):
+    """EWMA длительности process_job (для оценки ETA)"""
+    prev = avg_job_seconds()
+    r.set(JOB_SECONDS_KEY, prev + EWMA_ALPHA * (seconds - prev))
+
+
+def eta_seconds(depth: int) -> float:
+    """Примерное время до готовности задачи, вставшей в очередь глубины depth"""
+    avg = avg_job_seconds()
+    return (depth / max(WORKER_SLOTS, 1) + 1) * avg
+
+
+def _retry_after(excess_jobs: int) -> int:
+    seconds = excess_jobs / max(WORKER_SLOTS, 1) * avg_job_seconds()
+    return max(1, min(MAX_RETRY_AFTER, math.ceil(seconds)))
+
+
+def _client_jobs_key(client_id: str) -> str:
+    return f"client:{client_id}:jobs"
+
+
+def _client_hour_key(client_id: str) -> str:
+    return f"client:{client_id}:hour:{int(time.time() // 3600)}"
+
+
+def client_id_for(header_value: str | None, peer: str | None) -> str:
+    if TRUST_CLIENT_ID_HEADER and header_value:
+        return header_value
+    return peer or "anonymous"
+
+
+def check_queue(n_jobs: int = 1) -> Decision:
+    """Заполненность очереди кластера — дёшево, можно до чтения загрузки"""
+    for limit, name in (
+        (ADMISSION_MAX_QUEUE, "ADMISSION_MAX_QUEUE"),
+        (CLIENT_MAX_ACTIVE, "CLIENT_MAX_ACTIVE"),
+        (CLIENT_MAX_PER_HOUR, "CLIENT_MAX_PER_HOUR"),
+    ):
+        if n_jobs > limit:
+            return Decision(False, f"batch of {n_jobs} jobs exceeds {name}={limit}", retryable=False)
+
+    depth = queue_depth()
+    if depth + n_jobs > ADMISSION_MAX_QUEUE:
+        return Decision(False, "queue is full", _retry_after(depth + n_jobs - ADMISSION_MAX_QUEUE), depth)
+    return Decision(True, queue_depth=depth, eta_seconds=eta_seconds(depth))
+
+
+def admit(client_id: str, job_ids: list[str]) -> Decision:
+    """Проверяет квоты клиента и засчитывает в них job_ids — всё или ничего"""
+    jobs_key = _client_jobs_key(client_id)
+    hour_key = _client_hour_key(client_id)
+    n_jobs = len(job_ids)
+    depth = queue_depth()
+
+    with r.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(jobs_key, hour_key)
+                now = time.time()
+                # зависшие записи не считаем (удаляются уже в транзакции)
+                active = pipe.zcount(jobs_key, now - CLIENT_ACTIVE_TTL, "+inf")
+                if active + n_jobs > CLIENT_MAX_ACTIVE:
+                    pipe.unwatch()
+                    # слот клиента освободится примерно через время одной задачи
+                    return Decision(False, "too many active jobs for client", _retry_after(WORKER_SLOTS), depth)
+
+                submitted = int(pipe.get(hour_key) or 0)
+                if submitted + n_jobs > CLIENT_MAX_PER_HOUR:
+                    pipe.unwatch()
+                    retry = max(1, math.ceil(3600 - now % 3600))
+                    return Decision(False, "hourly quota exceeded for client", retry, depth)
+
+                pipe.multi()
+                pipe.zremrangebyscore(jobs_key, 0, now - CLIENT_ACTIVE_TTL)
+                pipe.zadd(jobs_key, {job_id: now for job_id in job_ids})
+                pipe.expire(jobs_key, CLIENT_ACTIVE_TTL)
+                pipe.incrby(hour_key, n_jobs)
+                pipe.expire(hour_key, 3600)
+                pipe.execute()
+                return Decision(True, queue_depth=depth, eta_seconds=eta_seconds(depth))
+            except redis.WatchError:
+                # параллельная загрузка того же клиента — пересчитываем
+                continue
+
+
+def unadmit(client_id: str, job_id: str):
+    """Задача засчитана, но не создана (присоединилась к дубликату) — возвращает квоту"""
+    hour_key = _client_hour_key(client_id)
+    r.zrem(_client_jobs_key(client_id), job_id)
+    if int(r.get(hour_key) or 0) > 0:
+        r.decr(hour_key)
+
+
+def release(job: dict):
+    """Задача завершилась (успех, ошибка, отмена) — освобождает слот клиента"""
+    client_id = job.get("client_id")
+    if client_id:
+        r.zrem(_client_jobs_key(client_id), job["job_id"])
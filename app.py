@@ -1,51 +1,258 @@
 import os
+import time
 import uuid
 import shutil
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+import hashlib
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse
 from dotenv import load_dotenv
 from fastapi.responses import HTMLResponse
 
-from storage import set_job, get_job
-from tasks import process_job
+from storage import (
+    set_job, get_job, delete_job, get_trace, touch_result, request_cancel, get_usage, usage_day,
+    USAGE_RETENTION_DAYS,
+    add_submitter, remove_submitter,
+)
+from workdir import WORKDIR, job_dir_for
+from tracing import build_tree
+from dedup import fingerprint, lookup, coalesce, release as release_fingerprint
+from ingest import S3_BUCKET, normalize_key
+import admission
+from usage import empty_usage, add_usage
+from pydantic import BaseModel
+
+from celery_app import celery, PROCESS_JOB_TASK, INGEST_TASK
 
 load_dotenv()
 
-WORKDIR = os.getenv("WORKDIR", "./workdir")
+INGEST_MAX_KEYS = int(os.getenv("INGEST_MAX_KEYS", "500"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# служебные поля записи: после дедупликации задачу смотрят и другие клиенты
+PRIVATE_JOB_FIELDS = (
+    "client_id", "fingerprint", "job_dir", "input_path", "original_path", "result_docx", "profile_path",
+)
 os.makedirs(WORKDIR, exist_ok=True)
 
 app = FastAPI(title="Slide→Report Platform")
 
 
+def _client_id(request: Request) -> str:
+    # X-Client-Id учитывается только при TRUST_CLIENT_ID_HEADER=1 (см. admission.py)
+    return admission.client_id_for(request.headers.get("X-Client-Id"), request.client.host if request.client else None)
+
+
+def _rejection(decision: admission.Decision) -> JSONResponse:
+    detail = {"reason": decision.reason, "queue_depth": decision.queue_depth}
+    if not decision.retryable:
+        return JSONResponse({"detail": detail}, status_code=413)
+    return JSONResponse({"detail": detail}, status_code=429, headers={"Retry-After": str(decision.retry_after)})
+
+
+@app.middleware("http")
+async def admit_uploads(request: Request, call_next):
+    # переполненная очередь проверяется здесь, до чтения тела: параметры File(...)
+    # FastAPI разбирает (и сохраняет загрузку целиком) ещё до вызова обработчика.
+    # Квоты клиента — в create_job, после дедупликации: дубликат их не тратит
+    if request.method == "POST" and request.url.path == "/jobs":
+        decision = admission.check_queue()
+        if not decision.admitted:
+            return _rejection(decision)
+    return await call_next(request)
+
+
 @app.post("/jobs")
-async def create_job(file: UploadFile = File(...)):
+async def create_job(request: Request, file: UploadFile = File(...), profile: bool = Form(False)):
+    client_id = _client_id(request)
+
     job_id = str(uuid.uuid4())
-    job_dir = os.path.join(WORKDIR, job_id)
+    job_dir = job_dir_for(job_id)
     os.makedirs(job_dir, exist_ok=True)
 
     input_path = os.path.join(job_dir, file.filename)
+    content_hash = hashlib.sha256()
     with open(input_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+        while chunk := file.file.read(UPLOAD_CHUNK_SIZE):
+            content_hash.update(chunk)
+            f.write(chunk)
 
+    ext = os.path.splitext(file.filename)[1].lower()
     job = {
         "job_id": job_id,
         "status": "queued",
         "filename": file.filename,
         "input_path": input_path,
         "job_dir": job_dir,
+        "profile": profile,
+        "client_id": client_id,
+        # все параметры, от которых зависит результат (profile — файл профиля)
+        "fingerprint": fingerprint(content_hash.hexdigest(), {"ext": ext, "profile": profile}),
+        "created_at": time.time(),
     }
+    # запись создаётся до захвата ключа: владелец без записи считается упавшим
     set_job(job_id, job)
 
-    process_job.delay(job_id)
+    # одинаковый файл с теми же параметрами -> присоединяемся к существующей задаче
+    existing = lookup(job["fingerprint"])
+    if existing is None:
+        # новая задача: квоты клиента проверяются и списываются атомарно
+        decision = admission.admit(client_id, [job_id])
+        if not decision.admitted:
+            delete_job(job_id)
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return _rejection(decision)
+        existing = coalesce(job["fingerprint"], job_id)
+        if existing is not None:
+            # такой же файл успели загрузить параллельно
+            admission.unadmit(client_id, job_id)
+    if existing is not None:
+        delete_job(job_id)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        resp = {"job_id": existing["job_id"], "status": existing["status"], "deduplicated": True}
+        if existing["status"] != "done":
+            # общая задача: DELETE одного клиента не отменяет её для остальных
+            add_submitter(existing["job_id"], client_id)
+        else:
+            touch_result(existing["job_id"])
+            resp["result_url"] = f"/jobs/{existing['job_id']}/result"
+        return resp
+
+    add_submitter(job_id, client_id)
+    # по имени задачи: API не импортирует стек воркера (tasks.py)
+    # task_id = job_id: задачу можно отозвать из очереди при отмене
+    celery.send_task(PROCESS_JOB_TASK, args=[job_id], task_id=job_id)
+
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "queue_depth": decision.queue_depth,
+        "eta_seconds": round(decision.eta_seconds),
+    }
+
+class StorageJobsRequest(BaseModel):
+    keys: list[str]
+    bucket: str | None = None
+    profile: bool = False
+
+@app.post("/jobs/from-storage")
+def create_jobs_from_storage(req: StorageJobsRequest, request: Request):
+    bucket = req.bucket or S3_BUCKET
+    if not bucket:
+        raise HTTPException(status_code=400, detail="bucket is not set (S3_BUCKET)")
+    if not req.keys:
+        raise HTTPException(status_code=400, detail="keys is empty")
+    if len(req.keys) > INGEST_MAX_KEYS:
+        raise HTTPException(status_code=400, detail=f"too many keys (max {INGEST_MAX_KEYS})")
+    client_id = _client_id(request)
+    decision = admission.check_queue(len(req.keys))
+    if not decision.admitted:
+        return _rejection(decision)
+    job_ids = [str(uuid.uuid4()) for _ in req.keys]
+    decision = admission.admit(client_id, job_ids)
+    if not decision.admitted:
+        return _rejection(decision)
 
-    return {"job_id": job_id, "status": "queued"}
+    jobs = []
+    for key, job_id in zip(req.keys, job_ids):
+        job_dir = job_dir_for(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "filename": normalize_key(key).split("/")[-1],
+            "input_path": None,
+            "job_dir": job_dir,
+            "profile": req.profile,
+            "client_id": client_id,
+            "source": {"type": "s3", "bucket": bucket, "key": key},
+            "created_at": time.time(),
+        }
+        set_job(job_id, job)
+        add_submitter(job_id, client_id)
+        jobs.append({"job_id": job_id, "key": key, "status": "queued"})
+
+    # одна задача на пачку: загрузки и конвертации идут параллельно
+    celery.send_task(INGEST_TASK, args=[[j["job_id"] for j in jobs], bucket])
+
+    return {"jobs": jobs}
 
 @app.get("/jobs/{job_id}")
 def job_status(job_id: str):
     job = get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="job not found")
-    return job
+    if job.get("status") in ("queued", "downloading"):
+        # позиция в очереди брокера не видна: оценка по её текущей глубине
+        depth = admission.queue_depth()
+        job = {**job, "queue_depth": depth, "eta_seconds": round(admission.eta_seconds(depth))}
+    return {k: v for k, v in job.items() if k not in PRIVATE_JOB_FIELDS}
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str, request: Request):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+    status = job.get("status")
+    if status not in ("queued", "downloading", "processing"):
+        raise HTTPException(status_code=409, detail=f"job status is {status}")
+
+    remaining = remove_submitter(job_id, _client_id(request))
+    if remaining is None:
+        raise HTTPException(status_code=403, detail="job was not submitted by this client")
+    if remaining:
+        # задачу ждут другие клиенты (дедупликация): отписываем только этого
+        return {"job_id": job_id, "status": status, "detached": True, "submitters": remaining}
+
+    # флаг видят и воркер в работе (проверяет раз в CANCEL_POLL_INTERVAL), и ingest
+    request_cancel(job_id)
+    set_job(job_id, {**job, "status": "cancelled", "cancelled_at": time.time()})
+    release_fingerprint(job)
+    admission.release(job)
+
+    if status == "queued":
+        # ещё не начата: снимаем из очереди, каталог удаляем сразу
+        celery.control.revoke(job_id)
+        shutil.rmtree(job["job_dir"], ignore_errors=True)
+    # processing / downloading: обрыв запросов и уборку делает воркер
+
+    return {"job_id": job_id, "status": "cancelled"}
+
+@app.get("/usage")
+def usage_summary(days: int = 7):
+    """Токены и стоимость LLM по кластеру за последние days суток (UTC): по дням, моделям и клиентам"""
+    # старше USAGE_RETENTION_DAYS счётчики в Redis уже истекли — были бы нули
+    if not 1 <= days <= USAGE_RETENTION_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be in 1..{USAGE_RETENTION_DAYS}")
+
+    now = time.time()
+    per_day = []
+    total = {"models": {}, "clients": {}, "jobs": {}}
+    for i in range(days):
+        day = usage_day(now - i * 86400)
+        stats = get_usage(day)
+        per_day.append({"day": day, **stats})
+        for group in ("models", "clients"):
+            for name, usage in stats[group].items():
+                add_usage(total[group].setdefault(name, empty_usage()), usage)
+        for name, value in stats["jobs"].items():
+            total["jobs"][name] = total["jobs"].get(name, 0) + value
+
+    overall = empty_usage()
+    for usage in total["models"].values():
+        add_usage(overall, usage)
+    slides = total["jobs"].get("slides", 0)
+    jobs_done = total["jobs"].get("jobs_done", 0)
+    return {
+        "days": days,
+        "total": overall,
+        # для сравнения до/после изменений промпта и кэширования
+        "tokens_per_slide": overall["total_tokens"] / slides if slides else None,
+        "tokens_per_job": overall["total_tokens"] / jobs_done if jobs_done else None,
+        "by_model": total["models"],
+        "by_client": total["clients"],
+        "jobs": total["jobs"],
+        "per_day": per_day,
+    }
 
 @app.get("/jobs/{job_id}/result")
 def job_result(job_id: str):
@@ -57,4 +264,23 @@ def job_result(job_id: str):
     path = job.get("result_docx")
     if not path or not os.path.exists(path):
         raise HTTPException(status_code=404, detail="result file not found")
+    touch_result(job_id)
     return FileResponse(path, filename="result.docx")
+
+@app.get("/jobs/{job_id}/trace")
+def job_trace(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+    trace = get_trace(job_id) or {"job_id": job_id, "spans": []}
+    return {**trace, "status": job.get("status"), "tree": build_tree(trace["spans"])}
+
+@app.get("/jobs/{job_id}/profile")
+def job_profile(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+    path = job.get("profile_path")
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="profile not found")
+    return FileResponse(path, filename="profile.folded", media_type="text/plain")
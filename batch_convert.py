@@ -0,0 +1,197 @@
+"""
+Пакетная обработка каталога презентаций без API, Redis и Celery.
+
+Для каждого файла (.pdf, .ppt, .pptx, .odp) во входном каталоге прогоняется
+полный конвейер (конвертация -> текст -> HTML по слайдам -> DOCX), результат
+кладётся в выходной каталог с той же структурой: deck.pptx -> deck.docx.
+Если в одном каталоге несколько презентаций с одним именем (deck.pptx и
+deck.pdf), расширение сохраняется: deck.pptx.docx, deck.pdf.docx.
+Уже готовые DOCX пропускаются (--force — пересобрать), поэтому прерванный
+прогон можно просто запустить заново.
+
+Одновременно в работе --concurrency презентаций; все они делят одну
+aiohttp-сессию (Gotenberg и LLM) и пул процессов для CPU-этапов
+(см. worker_runtime.AsyncRuntime). В конце печатается сводка в JSON:
+сколько сделано / пропущено / упало, слайдов и презентаций в минуту, токены.
+Прогресс и отладочный вывод конвейера идут в stderr, stdout — только сводка.
+
+    python batch_convert.py ./archive ./reports --concurrency 8 --report batch.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import contextlib
+import asyncio
+import argparse
+
+from dotenv import load_dotenv
+
+from pipeline import run_pipeline
+from usage import UsageMeter
+from worker_runtime import AsyncRuntime, CPU_POOL_SIZE, HTTP_POOL_LIMIT
+
+load_dotenv()
+
+INPUT_EXTENSIONS = (".pdf", ".ppt", ".pptx", ".odp")
+TMP_DIR_NAME = ".batch_tmp"
+
+
+def find_decks(input_dir: str, recursive: bool) -> list[str]:
+    """Пути презентаций относительно input_dir, по алфавиту"""
+    found = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".")) if recursive else []
+        for name in sorted(files):
+            if name.lower().endswith(INPUT_EXTENSIONS) and not name.startswith("."):
+                found.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return found
+
+
+def output_paths(output_dir: str, rel_paths: list[str]) -> dict[str, str]:
+    """Путь DOCX для каждой презентации; при совпадении имён без расширения оно остаётся в имени"""
+    stems = {}
+    for rel_path in rel_paths:
+        stem = os.path.splitext(rel_path)[0]
+        stems[stem] = stems.get(stem, 0) + 1
+    paths = {}
+    for rel_path in rel_paths:
+        stem = os.path.splitext(rel_path)[0]
+        name = rel_path if stems[stem] > 1 else stem
+        paths[rel_path] = os.path.join(output_dir, name + ".docx")
+    return paths
+
+
+def _stdout_to_stderr():
+    # процессы пула печатают служебное (build_docx: "DOCX saved: ..."), а stdout занят сводкой
+    sys.stdout = sys.stderr
+
+
+async def process_deck(runtime: AsyncRuntime, input_path: str, out_docx: str, work_dir: str, meter: UsageMeter) -> dict:
+    # рабочий каталог на презентацию: PDF и JSON не попадают ни во вход, ни в выход
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        local_input = os.path.join(work_dir, os.path.basename(input_path))
+        try:
+            os.symlink(os.path.abspath(input_path), local_input)
+        except OSError:
+            shutil.copyfile(input_path, local_input)
+
+        # DOCX собирается во временный файл: недописанный результат не считается готовым
+        partial_docx = os.path.join(work_dir, "result.docx")
+        summary = await run_pipeline(
+            local_input,
+            os.path.join(work_dir, "slides_report.json"),
+            partial_docx,
+            runtime.session,
+            runtime.run_cpu,
+            meter,
+        )
+        os.makedirs(os.path.dirname(out_docx), exist_ok=True)
+        shutil.move(partial_docx, out_docx)
+        return summary
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+async def run_batch(runtime: AsyncRuntime, args) -> dict:
+    decks = find_decks(args.input_dir, args.recursive)
+    out_paths = output_paths(args.output_dir, decks)
+    tmp_root = os.path.join(args.output_dir, TMP_DIR_NAME)
+    os.makedirs(tmp_root, exist_ok=True)
+
+    sem = asyncio.Semaphore(args.concurrency)
+    total_usage = UsageMeter()
+    results = []
+
+    async def handle(rel_path: str):
+        out_docx = out_paths[rel_path]
+        if not args.force and os.path.exists(out_docx):
+            results.append({"file": rel_path, "status": "skipped"})
+            return
+
+        async with sem:
+            meter = UsageMeter()
+            t0 = time.perf_counter()
+            try:
+                summary = await process_deck(
+                    runtime,
+                    os.path.join(args.input_dir, rel_path),
+                    out_docx,
+                    os.path.join(tmp_root, rel_path.replace(os.sep, "__")),
+                    meter,
+                )
+                rec = {"file": rel_path, "status": "done", "slides": summary["slides"], "routes": summary["routes"]}
+            except Exception as e:
+                rec = {"file": rel_path, "status": "error", "error": f"{type(e).__name__}: {e}"}
+            rec["seconds"] = round(time.perf_counter() - t0, 3)
+            rec["tokens"] = meter.total()["total_tokens"]
+            total_usage.merge(meter)
+            results.append(rec)
+            print(f"[{len(results)}/{len(decks)}] {rec['status']:5} {rel_path} ({rec['seconds']} s)", file=sys.stderr)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(handle(p) for p in decks))
+    wall = max(time.perf_counter() - t0, 1e-9)
+    shutil.rmtree(tmp_root, ignore_errors=True)
+
+    done = [r for r in results if r["status"] == "done"]
+    slides = sum(r["slides"] for r in done)
+    return {
+        "input_dir": args.input_dir,
+        "output_dir": args.output_dir,
+        "found": len(decks),
+        "done": len(done),
+        "skipped": sum(1 for r in results if r["status"] == "skipped"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "slides": slides,
+        "wall_seconds": round(wall, 3),
+        "decks_per_minute": round(len(done) / wall * 60, 2),
+        "slides_per_minute": round(slides / wall * 60, 2),
+        "usage": total_usage.to_dict(),
+        "files": sorted(results, key=lambda r: r["file"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная обработка каталога презентаций в DOCX")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--concurrency", type=int, default=4, help="презентаций одновременно")
+    parser.add_argument("--cpu-workers", type=int, default=CPU_POOL_SIZE, help="процессов для извлечения текста и DOCX")
+    parser.add_argument("--http-limit", type=int, default=HTTP_POOL_LIMIT, help="соединений к Gotenberg и LLM")
+    parser.add_argument("--recursive", action="store_true", help="обходить подкаталоги")
+    parser.add_argument("--force", action="store_true", help="пересобрать уже готовые DOCX")
+    parser.add_argument("--report", default=None, help="куда сохранить сводку (JSON); по умолчанию stdout")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"нет каталога: {args.input_dir}")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    runtime = AsyncRuntime(
+        cpu_workers=args.cpu_workers,
+        http_limit=args.http_limit,
+        cpu_initializer=_stdout_to_stderr,
+    ).start()
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            report = runtime.run(run_batch(runtime, args))
+    finally:
+        runtime.shutdown()
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text)
+        brief = {k: report[k] for k in ("done", "skipped", "failed", "decks_per_minute", "slides_per_minute")}
+        print(json.dumps(brief), file=sys.stderr)
+    else:
+        print(text)
+
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Общие утилиты бенчмарков: замеры, статистика, метаданные прогона, запись JSON.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией (q от 0 до 100)"""
+    if not values:
+        return 0.0
+    data = sorted(values)
+    k = (len(data) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(data) - 1)
+    return data[lo] + (data[hi] - data[lo]) * (k - lo)
+
+
+def summarize(samples: list[float]) -> dict:
+    """Сводка по замерам (в тех же единицах, что и samples)"""
+    if not samples:
+        return {"n": 0}
+    return {
+        "n": len(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "min": min(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": max(samples),
+    }
+
+
+def measure(fn, repeats: int, warmup: int = 1) -> list[float]:
+    """Время вызовов fn() в миллисекундах"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+async def ameasure(coro_fn, repeats: int, warmup: int = 0) -> list[float]:
+    """То же для корутин: coro_fn() должна возвращать новую корутину"""
+    for _ in range(warmup):
+        await coro_fn()
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        await coro_fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR, capture_output=True, text=True, timeout=5,
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_metadata(name: str, params: dict) -> dict:
+    return {
+        "benchmark": name,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+    }
+
+
+def write_result(result: dict, out_path: str | None):
+    """JSON в файл или в stdout (если out_path не задан)"""
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if out_path:
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        print("Saved:", out_path, file=sys.stderr)
+    else:
+        print(text)
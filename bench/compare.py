@@ -0,0 +1,73 @@
+"""
+Сравнение двух JSON-результатов бенчмарков (bench.stages и др.).
+
+Сравниваются все числовые поля p50/p95/mean с одинаковым путём в обоих файлах.
+Код выхода 1, если хотя бы одна метрика выросла больше чем на --threshold.
+
+Запуск: python -m bench.compare baseline.json current.json --threshold 0.15
+"""
+import sys
+import json
+import argparse
+
+COMPARED_KEYS = ("mean", "p50", "p95")
+
+
+def _flatten(node, prefix: str = "") -> dict[str, float]:
+    """{'stages.extract[slides=20].ms.p50': 12.3, ...}"""
+    out = {}
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in ("meta", "fakes"):
+                continue
+            if key in COMPARED_KEYS and isinstance(value, (int, float)):
+                out[f"{prefix}.{key}" if prefix else key] = float(value)
+            else:
+                out.update(_flatten(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(node, list):
+        for i, item in enumerate(node):
+            label = f"slides={item['slides']}" if isinstance(item, dict) and "slides" in item else str(i)
+            out.update(_flatten(item, f"{prefix}[{label}]"))
+    return out
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> tuple[list[dict], bool]:
+    base = _flatten(baseline)
+    cur = _flatten(current)
+    rows = []
+    regressed = False
+    for key in sorted(base.keys() & cur.keys()):
+        old, new = base[key], cur[key]
+        delta = (new - old) / old if old else 0.0
+        is_regression = delta > threshold
+        regressed |= is_regression
+        rows.append({"metric": key, "baseline": old, "current": new, "delta": delta, "regression": is_regression})
+    return rows, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение результатов бенчмарков")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.15, help="допустимый рост, доля (0.15 = 15%%)")
+    parser.add_argument("--json", action="store_true", help="вывести сравнение в JSON")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    rows, regressed = compare(baseline, current, args.threshold)
+    if args.json:
+        print(json.dumps({"threshold": args.threshold, "regressed": regressed, "metrics": rows}, ensure_ascii=False, indent=2))
+    else:
+        for row in rows:
+            mark = "REGRESSION" if row["regression"] else ""
+            print(f"{row['metric']:<60} {row['baseline']:>10.2f} -> {row['current']:>10.2f} {row['delta']:+7.1%} {mark}")
+
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
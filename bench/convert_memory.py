@@ -0,0 +1,115 @@
+"""
+Пиковая память конвертации в зависимости от размера презентации.
+
+Заглушки Gotenberg/LLM поднимаются отдельным процессом (чтобы их буферы не
+попали в замер), каждая конвертация — в отдельном чистом процессе, который
+сообщает свой ru_maxrss. Входной файл — PDF-заголовок + случайные байты
+нужного размера с расширением .pptx: заглушка возвращает его как есть, то есть
+ответ того же размера, что и вход.
+
+Запуск из корня репозитория:
+    python -m bench.convert_memory --sizes-mb 10,50,200 --out bench_results/convert_memory.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+
+from bench.common import BASE_DIR, run_metadata, write_result
+
+_PROBE = """
+import sys, json, time, resource, asyncio
+import aiohttp
+from pipeline import convert_to_pdf_if_needed
+
+async def main():
+    async with aiohttp.ClientSession() as session:
+        return await convert_to_pdf_if_needed(sys.argv[1], session)
+
+base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t0 = time.perf_counter()
+pdf_path = asyncio.run(main())
+print(json.dumps({
+    "ms": (time.perf_counter() - t0) * 1000,
+    "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "base_rss_kb": base_rss,
+    "pdf_path": pdf_path,
+}))
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_port(port: int, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"fake server did not start on port {port}")
+
+
+def make_blob(path: str, size_mb: int):
+    """Файл нужного размера, начинается с %PDF (заглушка Gotenberg вернёт его как есть)"""
+    chunk = 1024 * 1024
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.7\n")
+        for _ in range(size_mb):
+            f.write(os.urandom(chunk))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пиковая память конвертации vs размер файла")
+    parser.add_argument("--sizes-mb", default="10,50,200")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes_mb.split(",") if s]
+    gotenberg_port, llm_port = _free_port(), _free_port()
+    fakes = subprocess.Popen(
+        [sys.executable, "-m", "bench.fakes", "--gotenberg-port", str(gotenberg_port), "--llm-port", str(llm_port)],
+        cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    result = {"meta": run_metadata("convert_memory", {"sizes_mb": sizes}), "runs": []}
+    try:
+        _wait_port(gotenberg_port)
+        env = {**os.environ, "GOTENBERG_URL": f"http://127.0.0.1:{gotenberg_port}",
+               "GOTENBERG_URLS": f"http://127.0.0.1:{gotenberg_port}", "CONVERTER_BACKEND": "gotenberg",
+               "PYTHONDONTWRITEBYTECODE": "1"}
+        with tempfile.TemporaryDirectory(prefix="bench_convert_mem_") as tmp:
+            for size_mb in sizes:
+                path = os.path.join(tmp, f"blob_{size_mb}mb.pptx")
+                make_blob(path, size_mb)
+                out = subprocess.run(
+                    [sys.executable, "-c", _PROBE, path],
+                    cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True,
+                )
+                probe = json.loads(out.stdout.strip().splitlines()[-1])
+                result["runs"].append({
+                    "size_mb": size_mb,
+                    "ms": probe["ms"],
+                    "maxrss_mb": probe["maxrss_kb"] / 1024,
+                    "rss_growth_mb": (probe["maxrss_kb"] - probe["base_rss_kb"]) / 1024,
+                    "pdf_mb": os.path.getsize(probe["pdf_path"]) / (1024 * 1024),
+                })
+                os.remove(path)
+                os.remove(probe["pdf_path"])
+    finally:
+        fakes.terminate()
+        fakes.wait()
+
+    write_result(result, args.out)
+
+
+if __name__ == "__main__":
+    main()
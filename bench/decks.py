@@ -0,0 +1,118 @@
+"""
+Генератор синтетических презентаций для бенчмарков.
+
+Текст слайдов берётся из out.pdf (seed-корпус), длины варьируются:
+пустые слайды-картинки, заголовки-разделители, обычные и «плотные» слайды.
+Сгенерированный PDF можно сохранить с расширением .pptx — фейковый
+Gotenberg (bench/fakes.py) возвращает такие файлы как есть, поэтому
+размер «презентации» управляется числом слайдов.
+
+Запуск: python -m bench.decks --slides 40 --out workdir/deck_40.pptx
+"""
+import os
+import random
+import argparse
+
+import fitz
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_PDF = os.path.join(BASE_DIR, "out.pdf")
+SEED_PPTX = os.path.join(BASE_DIR, "test.pptx")
+
+PAGE_WIDTH = 720
+PAGE_HEIGHT = 405
+
+# доли слайдов разной «плотности»: (вид, вес, диапазон числа строк)
+SLIDE_KINDS = [
+    ("empty", 0.10, (0, 0)),
+    ("title", 0.20, (1, 2)),
+    ("regular", 0.45, (4, 12)),
+    ("dense", 0.25, (15, 40)),
+]
+
+_FALLBACK_CORPUS = [
+    "Методы принятия решений",
+    "Эвристический синтез",
+    "Экспертные оценки и метод Делфи",
+    "Количественные методы",
+]
+
+
+def seed_corpus(pdf_path: str = SEED_PDF) -> list[str]:
+    """Строки текста из seed-PDF (без пустых)"""
+    if not os.path.exists(pdf_path):
+        return list(_FALLBACK_CORPUS)
+
+    doc = fitz.open(pdf_path)
+    lines = []
+    for page in doc:
+        for line in page.get_text("text").splitlines():
+            line = line.strip()
+            if line:
+                lines.append(line)
+    doc.close()
+    return lines or list(_FALLBACK_CORPUS)
+
+
+def make_slide_texts(n_slides: int, seed: int = 0, corpus: list[str] = None) -> list[str]:
+    """Тексты N слайдов с разной длиной (детерминированно для одного seed)"""
+    rng = random.Random(seed)
+    corpus = corpus or seed_corpus()
+
+    kinds = [k for k, _, _ in SLIDE_KINDS]
+    weights = [w for _, w, _ in SLIDE_KINDS]
+    ranges = {k: r for k, _, r in SLIDE_KINDS}
+
+    texts = []
+    for i in range(n_slides):
+        # первый слайд всегда титульный
+        kind = "title" if i == 0 else rng.choices(kinds, weights)[0]
+        lo, hi = ranges[kind]
+        n_lines = rng.randint(lo, hi)
+        texts.append("\n".join(rng.choice(corpus) for _ in range(n_lines)))
+    return texts
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def build_deck_pdf(out_path: str, n_slides: int, seed: int = 0) -> str:
+    """Собирает PDF с N слайдами и возвращает путь к нему"""
+    texts = make_slide_texts(n_slides, seed=seed)
+
+    doc = fitz.open()
+    rect = fitz.Rect(36, 36, PAGE_WIDTH - 36, PAGE_HEIGHT - 36)
+    for text in texts:
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        if text:
+            html = "".join(f"<p>{_escape(line)}</p>" for line in text.splitlines())
+            # insert_htmlbox умеет кириллицу и сам уменьшает шрифт под рамку
+            page.insert_htmlbox(rect, html)
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    doc.save(out_path)
+    doc.close()
+    return out_path
+
+
+def build_deck_set(out_dir: str, sizes: list[int], seed: int = 0, ext: str = "pdf") -> list[str]:
+    """Набор презентаций заданных размеров: deck_<N>.<ext>"""
+    paths = []
+    for n in sizes:
+        path = os.path.join(out_dir, f"deck_{n}.{ext}")
+        if not os.path.exists(path):
+            build_deck_pdf(path, n, seed=seed + n)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Синтетическая презентация для бенчмарков")
+    parser.add_argument("--slides", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=os.path.join(BASE_DIR, "workdir", "deck.pdf"))
+    args = parser.parse_args()
+
+    path = build_deck_pdf(args.out, args.slides, seed=args.seed)
+    print("Deck saved:", path)
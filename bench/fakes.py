@@ -0,0 +1,268 @@
+"""
+Локальные заглушки Gotenberg и OpenAI-совместимого API (OpenRouter) для бенчмарков.
+
+У каждой заглушки настраиваются задержка, джиттер и доля ошибок, так что
+прогоны воспроизводимы и не зависят от живых сервисов.
+
+Gotenberg: POST /forms/libreoffice/convert
+    если загруженный файл уже PDF (синтетическая презентация из bench/decks.py
+    с расширением .pptx) — он возвращается как есть, иначе возвращается out.pdf.
+LLM: POST /chat/completions
+    HTML-ответ в формате PROMPT_TEMPLATE, длина зависит от текста слайда,
+    в ответе есть usage с оценкой числа токенов.
+Обе заглушки отдают счётчики на GET /__stats.
+
+Запуск: python -m bench.fakes --gotenberg-port 3001 --llm-port 3002 --llm-latency 0.5
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass, field, asdict
+
+from aiohttp import web
+
+from bench.decks import SEED_PDF
+
+SLIDE_TEXT_MARKER = "Текст слайда (из PDF):"
+
+
+@dataclass
+class FakeServiceConfig:
+    latency: float = 0.0      # базовая задержка ответа, сек
+    jitter: float = 0.0       # +- равномерный шум к задержке, сек
+    error_rate: float = 0.0   # доля ответов 503
+    per_kb: float = 0.0       # доп. задержка на КБ входа (имитация «тяжёлых» файлов), сек
+    seed: int = 0
+
+
+@dataclass
+class FakeServiceStats:
+    requests: int = 0
+    errors: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    bytes_in: int = 0
+    busy_seconds: float = 0.0
+    started_at: float = field(default_factory=time.time)
+
+
+class _FakeService:
+    def __init__(self, config: FakeServiceConfig):
+        self.config = config
+        self.stats = FakeServiceStats()
+        self.rng = random.Random(config.seed)
+
+    async def _simulate(self, size_bytes: int) -> bool:
+        """Ждёт настроенную задержку; False — нужно ответить ошибкой"""
+        cfg = self.config
+        delay = cfg.latency + cfg.per_kb * size_bytes / 1024
+        if cfg.jitter:
+            delay += self.rng.uniform(-cfg.jitter, cfg.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self.rng.random() >= cfg.error_rate
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        st = self.stats
+        st.requests += 1
+        st.in_flight += 1
+        st.max_in_flight = max(st.max_in_flight, st.in_flight)
+        t0 = time.perf_counter()
+        try:
+            return await self.respond(request)
+        finally:
+            st.in_flight -= 1
+            st.busy_seconds += time.perf_counter() - t0
+
+    async def respond(self, request: web.Request) -> web.StreamResponse:
+        raise NotImplementedError
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(asdict(self.stats))
+
+    def make_app(self, route: str) -> web.Application:
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_post(route, self.handle)
+        app.router.add_get("/__stats", self.handle_stats)
+        return app
+
+
+class FakeGotenberg(_FakeService):
+    ROUTE = "/forms/libreoffice/convert"
+
+    def __init__(self, config: FakeServiceConfig, seed_pdf: str = SEED_PDF):
+        super().__init__(config)
+        with open(seed_pdf, "rb") as f:
+            self.seed_pdf = f.read()
+
+    async def respond(self, request: web.Request) -> web.StreamResponse:
+        payload = b""
+        reader = await request.multipart()
+        async for part in reader:
+            if part.name == "files":
+                payload = await part.read()
+
+        self.stats.bytes_in += len(payload)
+        if not await self._simulate(len(payload)):
+            self.stats.errors += 1
+            return web.Response(status=503, text="fake gotenberg: injected error")
+
+        body = payload if payload.startswith(b"%PDF") else self.seed_pdf
+        return web.Response(body=body, content_type="application/pdf")
+
+
+def fake_slide_html(slide_text: str, rng: random.Random) -> str:
+    lines = [line for line in slide_text.splitlines() if line.strip() and not line.startswith("[")]
+    title = lines[0] if lines else "Слайд без текста"
+    theses = lines[1:6] or [title]
+    n_paragraphs = 1 + min(len(lines) // 8, 2)
+    body = " ".join(lines) or "Слайд содержит иллюстрацию."
+
+    parts = [f"<p><strong>Заголовок:</strong> {title}</p>", "<p><strong>Ключевые тезисы:</strong></p>", "<ul>"]
+    parts += [f"<li>{t}</li>" for t in theses]
+    parts += ["</ul>", "<p><strong>Текст сопровождения:</strong></p>"]
+    parts += [f"<p>{body}</p>" for _ in range(n_paragraphs)]
+    parts += ["<p><strong>Источники:</strong></p>", "<ul>"]
+    parts += [f"<li>Источник {rng.randint(1, 99)}: https://example.org/{rng.randint(1000, 9999)}</li>" for _ in range(2)]
+    parts.append("</ul>")
+    return "\n".join(parts)
+
+
+class FakeLLM(_FakeService):
+    ROUTE = "/chat/completions"
+
+    async def respond(self, request: web.Request) -> web.StreamResponse:
+        raw = await request.read()
+        self.stats.bytes_in += len(raw)
+
+        if not await self._simulate(0):
+            self.stats.errors += 1
+            return web.json_response({"error": {"message": "fake llm: injected error"}}, status=503)
+
+        payload = json.loads(raw)
+        prompt = payload["messages"][-1]["content"]
+        slide_text = prompt.split(SLIDE_TEXT_MARKER, 1)[-1]
+        html = fake_slide_html(slide_text, self.rng)
+
+        prompt_tokens = sum(len(m["content"]) for m in payload["messages"]) // 4
+        completion_tokens = len(html) // 4
+        return web.json_response({
+            "id": f"fake-{self.stats.requests}",
+            "model": payload.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": html}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+async def start_service(service: _FakeService, route: str, host: str = "127.0.0.1", port: int = 0):
+    """Поднимает заглушку, возвращает (runner, base_url). port=0 — свободный порт"""
+    runner = web.AppRunner(service.make_app(route), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    real_port = runner.addresses[0][1]
+    return runner, f"http://{host}:{real_port}"
+
+
+class FakeServices:
+    """
+    Async-контекст: поднимает обе заглушки и прописывает их в окружение
+    (GOTENBERG_URL и GOTENBERG_URLS, OPENROUTER_URL, OPENROUTER_API_KEY;
+    CONVERTER_BACKEND=gotenberg — иначе конвертация ушла бы мимо заглушки).
+
+    Модули, читающие адреса при импорте (local_openai), нужно импортировать
+    уже внутри контекста.
+    """
+
+    def __init__(self, gotenberg: FakeServiceConfig = None, llm: FakeServiceConfig = None, set_env: bool = True):
+        self.gotenberg = FakeGotenberg(gotenberg or FakeServiceConfig())
+        self.llm = FakeLLM(llm or FakeServiceConfig())
+        self.set_env = set_env
+        self._runners = []
+        self.gotenberg_url = None
+        self.llm_url = None
+
+    async def __aenter__(self):
+        runner, self.gotenberg_url = await start_service(self.gotenberg, FakeGotenberg.ROUTE)
+        self._runners.append(runner)
+        runner, self.llm_url = await start_service(self.llm, FakeLLM.ROUTE)
+        self._runners.append(runner)
+
+        if self.set_env:
+            os.environ["GOTENBERG_URL"] = self.gotenberg_url
+            # GOTENBERG_URLS важнее GOTENBERG_URL — иначе бенчмарк уйдёт в настоящий кластер
+            os.environ["GOTENBERG_URLS"] = self.gotenberg_url
+            os.environ["CONVERTER_BACKEND"] = "gotenberg"
+            os.environ["OPENROUTER_URL"] = self.llm_url
+            os.environ.setdefault("OPENROUTER_API_KEY", "bench-key")
+        return self
+
+    async def __aexit__(self, *exc):
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners.clear()
+
+    def stats(self) -> dict:
+        return {"gotenberg": asdict(self.gotenberg.stats), "llm": asdict(self.llm.stats)}
+
+
+def add_fake_args(parser: argparse.ArgumentParser):
+    """Общие параметры заглушек для CLI бенчмарков"""
+    for name in ("gotenberg", "llm"):
+        parser.add_argument(f"--{name}-latency", type=float, default=0.0)
+        parser.add_argument(f"--{name}-jitter", type=float, default=0.0)
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def fake_configs_from_args(args) -> tuple[FakeServiceConfig, FakeServiceConfig]:
+    gotenberg = FakeServiceConfig(
+        latency=args.gotenberg_latency,
+        jitter=args.gotenberg_jitter,
+        error_rate=args.gotenberg_error_rate,
+        seed=args.seed,
+    )
+    llm = FakeServiceConfig(
+        latency=args.llm_latency,
+        jitter=args.llm_jitter,
+        error_rate=args.llm_error_rate,
+        seed=args.seed + 1,
+    )
+    return gotenberg, llm
+
+
+async def _serve_forever(args):
+    gotenberg_cfg, llm_cfg = fake_configs_from_args(args)
+    runners = []
+    runner, gotenberg_url = await start_service(FakeGotenberg(gotenberg_cfg), FakeGotenberg.ROUTE, args.host, args.gotenberg_port)
+    runners.append(runner)
+    runner, llm_url = await start_service(FakeLLM(llm_cfg), FakeLLM.ROUTE, args.host, args.llm_port)
+    runners.append(runner)
+
+    print("GOTENBERG_URL =", gotenberg_url)
+    print("GOTENBERG_URLS =", gotenberg_url)
+    print("OPENROUTER_URL =", llm_url)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заглушки Gotenberg и LLM")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--gotenberg-port", type=int, default=3001)
+    parser.add_argument("--llm-port", type=int, default=3002)
+    add_fake_args(parser)
+    try:
+        asyncio.run(_serve_forever(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
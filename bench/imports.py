@@ -0,0 +1,96 @@
+"""
+Время импорта и RSS точек входа (app — процесс API, tasks — воркер).
+
+Каждый замер — отдельный чистый процесс python: время `import <module>`,
+пиковый RSS после импорта, число модулей и какие тяжёлые зависимости
+оказались загружены. С --importtime добавляется топ модулей по
+кумулятивному времени из `python -X importtime`.
+
+Запуск из корня репозитория:
+    python -m bench.imports --repeats 5 --out bench_results/imports.json
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from bench.common import BASE_DIR, summarize, run_metadata, write_result
+
+ENTRY_POINTS = ("app", "tasks")
+HEAVY_MODULES = ("fitz", "docx", "bs4", "boto3", "botocore", "celery", "aiohttp", "requests", "fastapi", "redis")
+
+_PROBE = """
+import sys, time, json, resource
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+    "heavy_loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def _probe_env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("WORKDIR", workdir)
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def probe(module: str, workdir: str) -> dict:
+    code = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BASE_DIR, env=_probe_env(workdir), capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def importtime_top(module: str, workdir: str, top: int) -> list[dict]:
+    """Топ модулей по кумулятивному времени импорта (мкс)"""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR, env=_probe_env(workdir), capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    rows.sort(key=lambda r: r["cumulative_us"], reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта и RSS точек входа")
+    parser.add_argument("--modules", default=",".join(ENTRY_POINTS))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--importtime", type=int, default=0, help="топ-N модулей из -X importtime (0 — не считать)")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    workdir = os.path.join(BASE_DIR, "workdir")
+    result = {"meta": run_metadata("imports", vars(args)), "entry_points": {}}
+    for module in (m for m in args.modules.split(",") if m):
+        samples = [probe(module, workdir) for _ in range(args.repeats)]
+        entry = {
+            "import_ms": summarize([s["import_ms"] for s in samples]),
+            "maxrss_mb": summarize([s["maxrss_kb"] / 1024 for s in samples]),
+            "modules": samples[-1]["modules"],
+            "heavy_loaded": samples[-1]["heavy_loaded"],
+        }
+        if args.importtime:
+            entry["importtime_top"] = importtime_top(module, workdir, args.importtime)
+        result["entry_points"][module] = entry
+
+    write_result(result, args.out)
+
+
+if __name__ == "__main__":
+    main()
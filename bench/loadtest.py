@@ -0,0 +1,292 @@
+"""
+Сквозной нагрузочный тест: POST /jobs -> process_job -> GET /jobs/{id}/result.
+
+Поднимает настоящие процессы: Redis (redis-server из PATH или --redis-server,
+либо внешний --redis-url), заглушки Gotenberg/LLM (bench.fakes), воркеры
+Celery (celery -A tasks worker) и API (uvicorn app:app). Затем подаёт задачи
+пуассоновским потоком с заданной интенсивностью и распределением размеров
+презентаций и ждёт результатов.
+
+Отчёт (JSON): ожидание в очереди, сквозная задержка p50/p95/p99, задач в
+минуту, загрузка воркеров, ошибки и отказы (429).
+
+Каждая загрузка получает уникальный хвост (комментарий после %%EOF),
+чтобы дедупликация не склеивала одинаковые презентации.
+
+Запуск из корня репозитория:
+    python -m bench.loadtest --rate 0.5 --duration 120 --sizes 5:0.5,20:0.3,80:0.2 \\
+        --workers 2 --concurrency 4 --llm-latency 0.8 --out bench_results/loadtest.json
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import aiohttp
+
+from bench.common import BASE_DIR, summarize, run_metadata, write_result
+from bench.decks import build_deck_set
+from bench.fakes import add_fake_args
+
+FINAL_STATUSES = ("done", "error", "cancelled", "evicted")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_port(port: int, proc: subprocess.Popen = None, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"process exited early: {' '.join(proc.args)}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"port {port} did not open in {timeout}s")
+
+
+def parse_sizes(spec: str) -> list[tuple[int, float]]:
+    """'5:0.5,20:0.3,80:0.2' -> [(5, 0.5), (20, 0.3), (80, 0.2)]"""
+    out = []
+    for part in spec.split(","):
+        size, _, weight = part.partition(":")
+        out.append((int(size), float(weight or 1)))
+    return out
+
+
+class Cluster:
+    """Процессы стенда; останавливаются в обратном порядке"""
+
+    def __init__(self, args, tmp: str):
+        self.args = args
+        self.tmp = tmp
+        self.procs: list[subprocess.Popen] = []
+        self.env = dict(os.environ)
+        self.api_url = None
+
+    def _spawn(self, cmd: list[str], name: str) -> subprocess.Popen:
+        log = open(os.path.join(self.tmp, f"{name}.log"), "wb")
+        proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=self.env, stdout=log, stderr=subprocess.STDOUT)
+        self.procs.append(proc)
+        return proc
+
+    def start(self):
+        a = self.args
+        if a.redis_url:
+            redis_url = a.redis_url
+        else:
+            redis_bin = a.redis_server or shutil.which("redis-server")
+            if not redis_bin:
+                raise SystemExit("redis-server не найден: укажите --redis-server или --redis-url")
+            port = _free_port()
+            proc = self._spawn([redis_bin, "--port", str(port), "--save", "", "--appendonly", "no"], "redis")
+            _wait_port(port, proc)
+            redis_url = f"redis://127.0.0.1:{port}/0"
+
+        gotenberg_port, llm_port = _free_port(), _free_port()
+        proc = self._spawn([
+            sys.executable, "-m", "bench.fakes",
+            "--gotenberg-port", str(gotenberg_port), "--llm-port", str(llm_port),
+            "--gotenberg-latency", str(a.gotenberg_latency), "--gotenberg-jitter", str(a.gotenberg_jitter),
+            "--gotenberg-error-rate", str(a.gotenberg_error_rate),
+            "--llm-latency", str(a.llm_latency), "--llm-jitter", str(a.llm_jitter),
+            "--llm-error-rate", str(a.llm_error_rate), "--seed", str(a.seed),
+        ], "fakes")
+        _wait_port(gotenberg_port, proc)
+        _wait_port(llm_port, proc)
+
+        self.env.update({
+            "REDIS_URL": redis_url,
+            "WORKDIR": os.path.join(self.tmp, "workdir"),
+            "GOTENBERG_URL": f"http://127.0.0.1:{gotenberg_port}",
+            "GOTENBERG_URLS": f"http://127.0.0.1:{gotenberg_port}",
+            "CONVERTER_BACKEND": "gotenberg",
+            "OPENROUTER_URL": f"http://127.0.0.1:{llm_port}",
+            "OPENROUTER_API_KEY": "loadtest-key",
+            "WORKER_MODE": a.worker_mode,
+            "GOTENBERG_RETRY_DELAY": "0.5",
+            "PYTHONDONTWRITEBYTECODE": "1",
+        })
+        pool = "threads" if a.worker_mode == "async" else a.pool
+        for i in range(a.workers):
+            self._spawn([
+                sys.executable, "-m", "celery", "-A", "tasks", "worker",
+                "--pool", pool, "--concurrency", str(a.concurrency),
+                "--hostname", f"loadtest{i}@%h", "--loglevel", "WARNING", "--without-gossip", "--without-mingle",
+            ], f"worker{i}")
+
+        api_port = _free_port()
+        proc = self._spawn([
+            sys.executable, "-m", "uvicorn", "app:app",
+            "--host", "127.0.0.1", "--port", str(api_port), "--log-level", "warning",
+        ], "api")
+        _wait_port(api_port, proc)
+        self.api_url = f"http://127.0.0.1:{api_port}"
+
+    def stop(self):
+        for proc in reversed(self.procs):
+            proc.terminate()
+        for proc in reversed(self.procs):
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+async def _submit_and_wait(session: aiohttp.ClientSession, api_url: str, deck: bytes, slides: int, args) -> dict:
+    rec = {"slides": slides, "submitted_at": time.time()}
+    # уникальный хвост после %%EOF: иначе дедупликация склеит одинаковые презентации
+    payload = deck + f"\n%loadtest {uuid.uuid4()}\n".encode()
+    form = aiohttp.FormData()
+    form.add_field("file", payload, filename=f"deck_{slides}.pptx", content_type="application/octet-stream")
+
+    async with session.post(f"{api_url}/jobs", data=form) as resp:
+        rec["http_status"] = resp.status
+        if resp.status == 429:
+            rec["status"] = "rejected"
+            rec["retry_after"] = resp.headers.get("Retry-After")
+            return rec
+        body = await resp.json()
+    if rec["http_status"] != 200:
+        rec["status"] = "submit_error"
+        return rec
+
+    job_id = body["job_id"]
+    rec["job_id"] = job_id
+    deadline = time.time() + args.job_timeout
+    while time.time() < deadline:
+        await asyncio.sleep(args.poll_interval)
+        async with session.get(f"{api_url}/jobs/{job_id}") as resp:
+            job = await resp.json()
+        if job.get("status") in FINAL_STATUSES:
+            break
+    else:
+        rec["status"] = "timeout"
+        return rec
+
+    rec["status"] = job["status"]
+    if job["status"] == "done":
+        async with session.get(f"{api_url}/jobs/{job_id}/result") as resp:
+            await resp.read()
+    rec["finished_client_at"] = time.time()
+    for key in ("created_at", "started_at", "finished_at"):
+        rec[key] = job.get(key)
+    return rec
+
+
+async def drive(api_url: str, decks: dict[int, bytes], args) -> tuple[list[dict], float, float]:
+    rng = random.Random(args.seed)
+    sizes = parse_sizes(args.sizes)
+    population = [s for s, _ in sizes]
+    weights = [w for _, w in sizes]
+
+    tasks = []
+    timeout = aiohttp.ClientTimeout(total=None)
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        t0 = time.time()
+        n = 0
+        while time.time() - t0 < args.duration and (not args.jobs or n < args.jobs):
+            slides = rng.choices(population, weights)[0]
+            tasks.append(asyncio.create_task(_submit_and_wait(session, api_url, decks[slides], slides, args)))
+            n += 1
+            # пуассоновский поток: экспоненциальные интервалы
+            await asyncio.sleep(rng.expovariate(args.rate))
+        records = await asyncio.gather(*tasks)
+        t1 = time.time()
+    return records, t0, t1
+
+
+def report(records: list[dict], t0: float, t1: float, args) -> dict:
+    done = [r for r in records if r["status"] == "done"]
+    wall = max(t1 - t0, 1e-9)
+
+    queue_wait = [r["started_at"] - r["created_at"] for r in done if r.get("started_at") and r.get("created_at")]
+    service = [r["finished_at"] - r["started_at"] for r in done if r.get("finished_at") and r.get("started_at")]
+    e2e = [r["finished_client_at"] - r["submitted_at"] for r in done]
+
+    by_size = {}
+    for r in done:
+        by_size.setdefault(r["slides"], []).append(r["finished_client_at"] - r["submitted_at"])
+
+    statuses = {}
+    for r in records:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+
+    slots = args.workers * args.concurrency
+    return {
+        "submitted": len(records),
+        "statuses": statuses,
+        "wall_seconds": wall,
+        "jobs_per_minute": len(done) / wall * 60,
+        "slides_per_minute": sum(r["slides"] for r in done) / wall * 60,
+        "queue_wait_s": summarize(queue_wait),
+        "service_time_s": summarize(service),
+        "e2e_latency_s": summarize(e2e),
+        "e2e_latency_by_size_s": {str(k): summarize(v) for k, v in sorted(by_size.items())},
+        "worker_slots": slots,
+        # доля времени слотов, занятая process_job
+        "worker_utilization": sum(service) / (slots * wall) if slots else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной нагрузочный тест API + Celery")
+    parser.add_argument("--rate", type=float, default=0.5, help="интенсивность подачи, задач/сек")
+    parser.add_argument("--duration", type=float, default=60, help="длительность подачи, сек")
+    parser.add_argument("--jobs", type=int, default=0, help="ограничить число задач (0 — без ограничения)")
+    parser.add_argument("--sizes", default="5:0.5,20:0.3,80:0.2", help="слайдов:вес через запятую")
+    parser.add_argument("--workers", type=int, default=1, help="процессов celery worker")
+    parser.add_argument("--concurrency", type=int, default=4, help="--concurrency каждого воркера")
+    parser.add_argument("--pool", default="prefork", help="пул Celery в режиме prefork")
+    parser.add_argument("--worker-mode", default="prefork", choices=("prefork", "async"))
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--job-timeout", type=float, default=1800)
+    parser.add_argument("--redis-url", default=None, help="внешний Redis вместо встроенного")
+    parser.add_argument("--redis-server", default=None, help="путь к redis-server")
+    parser.add_argument("--keep-logs", action="store_true", help="не удалять каталог с логами процессов")
+    parser.add_argument("--out", default=None)
+    add_fake_args(parser)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_loadtest_")
+    cluster = Cluster(args, tmp)
+    try:
+        sizes = [s for s, _ in parse_sizes(args.sizes)]
+        paths = build_deck_set(os.path.join(tmp, "decks"), sizes, seed=args.seed)
+        decks = {}
+        for size, path in zip(sizes, paths):
+            with open(path, "rb") as f:
+                decks[size] = f.read()
+
+        cluster.start()
+        records, t0, t1 = asyncio.run(drive(cluster.api_url, decks, args))
+        result = {
+            "meta": run_metadata("loadtest", vars(args)),
+            "summary": report(records, t0, t1, args),
+            "jobs": records,
+        }
+    finally:
+        cluster.stop()
+        if args.keep_logs:
+            print("Logs:", tmp, file=sys.stderr)
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    write_result(result, args.out)
+
+
+if __name__ == "__main__":
+    main()
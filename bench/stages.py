@@ -0,0 +1,165 @@
+"""
+Микробенчмарки этапов конвейера без живых сервисов.
+
+Этапы:
+    extract  — pdf_to_pages_text на синтетических презентациях
+    validate — validate_html / sanitize_html на HTML-ответах заглушки LLM
+    docx     — build_docx_from_slides
+    convert  — convert_to_pdf_if_needed через заглушку Gotenberg
+    generate — generate_slides_json через заглушку LLM
+
+Результат — JSON (stdout или --out), сравнение прогонов: python -m bench.compare.
+
+Запуск из корня репозитория:
+    python -m bench.stages --sizes 5,20,80 --repeats 5 --out bench_results/stages.json
+"""
+import os
+import sys
+import json
+import random
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+from bench.common import summarize, measure, ameasure, run_metadata, write_result
+from bench.decks import build_deck_set, make_slide_texts
+from bench.fakes import FakeServices, fake_slide_html, add_fake_args, fake_configs_from_args
+
+ALL_STAGES = ("extract", "validate", "docx", "convert", "generate")
+
+
+def _slides_json(path: str, n_slides: int, seed: int) -> str:
+    rng = random.Random(seed)
+    texts = make_slide_texts(n_slides, seed=seed)
+    slides = [{"slide": i, "generated_html": fake_slide_html(t, rng)} for i, t in enumerate(texts, start=1)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(slides, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def bench_extract(decks: dict[int, str], repeats: int) -> list[dict]:
+    from pdf_extract import pdf_to_pages_text
+
+    rows = []
+    for size, path in decks.items():
+        samples = measure(lambda: pdf_to_pages_text(path), repeats)
+        rows.append({"slides": size, "ms": summarize(samples), "ms_per_slide": summarize([s / size for s in samples])})
+    return rows
+
+
+def bench_validate(sizes: list[int], repeats: int, seed: int) -> list[dict]:
+    from clean_html import validate_html, sanitize_html
+
+    rows = []
+    for size in sizes:
+        rng = random.Random(seed)
+        htmls = [fake_slide_html(t, rng) for t in make_slide_texts(size, seed=seed + size)]
+
+        def run_validate():
+            for h in htmls:
+                validate_html(h)
+
+        def run_sanitize():
+            for h in htmls:
+                sanitize_html(h)
+
+        rows.append({
+            "slides": size,
+            "validate_ms": summarize(measure(run_validate, repeats)),
+            "sanitize_ms": summarize(measure(run_sanitize, repeats)),
+            "html_bytes": sum(len(h.encode("utf-8")) for h in htmls),
+        })
+    return rows
+
+
+def bench_docx(sizes: list[int], repeats: int, seed: int, tmp: str) -> list[dict]:
+    from build_docx import build_docx_from_slides
+
+    rows = []
+    for size in sizes:
+        json_path = _slides_json(os.path.join(tmp, f"slides_{size}.json"), size, seed + size)
+        out_path = os.path.join(tmp, f"result_{size}.docx")
+        # build_docx_from_slides печатает путь — в JSON-выводе это лишнее
+        with contextlib.redirect_stdout(sys.stderr):
+            samples = measure(lambda: build_docx_from_slides(json_path, out_path), repeats)
+        rows.append({"slides": size, "ms": summarize(samples), "docx_bytes": os.path.getsize(out_path)})
+    return rows
+
+
+async def bench_services(stages: list[str], decks: dict[int, str], repeats: int, tmp: str, fakes: FakeServices) -> dict:
+    import aiohttp
+    # импорт внутри контекста заглушек: local_openai читает OPENROUTER_URL при импорте
+    from pipeline import convert_to_pdf_if_needed, generate_slides_json
+
+    result = {}
+    if "convert" in stages:
+        rows = []
+        async with aiohttp.ClientSession() as session:
+            for size, path in decks.items():
+                pptx_path = os.path.join(tmp, f"convert_{size}.pptx")
+                with open(path, "rb") as src, open(pptx_path, "wb") as dst:
+                    dst.write(src.read())
+                samples = await ameasure(lambda: convert_to_pdf_if_needed(pptx_path, session), repeats)
+                rows.append({"slides": size, "ms": summarize(samples)})
+        result["convert"] = rows
+
+    if "generate" in stages:
+        rows = []
+        for size, path in decks.items():
+            out_json = os.path.join(tmp, f"generated_{size}.json")
+            samples = await ameasure(lambda: generate_slides_json(path, out_json), repeats)
+            rows.append({"slides": size, "ms": summarize(samples), "ms_per_slide": summarize([s / size for s in samples])})
+        result["generate"] = rows
+
+    result["fakes"] = fakes.stats()
+    return result
+
+
+async def run(args) -> dict:
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(ALL_STAGES)
+    if unknown:
+        raise SystemExit(f"Неизвестные этапы: {', '.join(sorted(unknown))}")
+
+    gotenberg_cfg, llm_cfg = fake_configs_from_args(args)
+    params = {**vars(args), "sizes": sizes, "stages": stages}
+    result = {"meta": run_metadata("stages", params), "stages": {}}
+
+    with tempfile.TemporaryDirectory(prefix="bench_stages_") as tmp:
+        os.environ["WORKDIR"] = tmp
+        decks = dict(zip(sizes, build_deck_set(tmp, sizes, seed=args.seed)))
+
+        if "extract" in stages:
+            result["stages"]["extract"] = bench_extract(decks, args.repeats)
+        if "validate" in stages:
+            result["stages"]["validate"] = bench_validate(sizes, args.repeats, args.seed)
+        if "docx" in stages:
+            result["stages"]["docx"] = bench_docx(sizes, args.repeats, args.seed, tmp)
+
+        service_stages = [s for s in stages if s in ("convert", "generate")]
+        if service_stages:
+            async with FakeServices(gotenberg_cfg, llm_cfg) as fakes:
+                svc = await bench_services(service_stages, decks, args.service_repeats, tmp, fakes)
+            result["fakes"] = svc.pop("fakes")
+            result["stages"].update(svc)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки этапов конвейера")
+    parser.add_argument("--sizes", default="5,20,80", help="размеры презентаций (слайдов) через запятую")
+    parser.add_argument("--stages", default=",".join(ALL_STAGES))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--service-repeats", type=int, default=1, help="повторы для convert/generate")
+    parser.add_argument("--out", default=None, help="куда сохранить JSON (по умолчанию stdout)")
+    add_fake_args(parser)
+    args = parser.parse_args()
+
+    write_result(asyncio.run(run(args)), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Лёгкий Celery-клиент без зависимостей конвейера.
+
+API ставит задачи по имени (send_task) и не импортирует tasks.py вместе с
+fitz / python-docx / bs4 / boto3. Воркер запускается как раньше: celery -A tasks worker
+"""
+import os
+from celery import Celery
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REDIS_URL = (os.getenv("REDIS_URL") or "redis://localhost:6379/0").strip()
+
+PROCESS_JOB_TASK = "tasks.process_job"
+INGEST_TASK = "tasks.ingest_from_storage"
+JANITOR_TASK = "tasks.janitor_sweep"
+
+JANITOR_INTERVAL = int(os.getenv("JANITOR_INTERVAL", "300"))
+
+celery = Celery(
+    "worker",
+    broker=REDIS_URL,
+    backend=REDIS_URL,
+)
+
+# важно для windows иногда:
+celery.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+)
+
+# уборка WORKDIR: celery -A tasks beat
+celery.conf.beat_schedule = {
+    "janitor-sweep": {"task": JANITOR_TASK, "schedule": JANITOR_INTERVAL},
+}
@@ -0,0 +1,390 @@
+"""
+Бэкенды конвертации презентаций в PDF для PresentationConverter.
+
+CONVERTER_BACKEND=gotenberg (по умолчанию) — HTTP к Gotenberg. Адресов
+может быть несколько (GOTENBERG_URLS через запятую, иначе GOTENBERG_URL):
+запрос уходит на инстанс с наименьшим числом запросов в работе, упавший
+инстанс на GOTENBERG_COOLDOWN секунд выводится из ротации, повтор идёт
+на другой инстанс.
+
+CONVERTER_BACKEND=libreoffice — пул «тёплых» headless LibreOffice в
+текущем процессе (unoserver), без HTTP и без запуска офиса на каждый файл:
+    pip install unoserver   # в python, которому доступен модуль uno
+Каждый слот — свой unoserver со своим профилем LibreOffice. Перед выдачей
+слот проверяется (процесс жив, порт отвечает), после LIBREOFFICE_MAX_CONVERSIONS
+конвертаций перезапускается, конвертация дольше LIBREOFFICE_TIMEOUT
+прерывается вместе с перезапуском слота.
+"""
+import os
+import time
+import shlex
+import shutil
+import atexit
+import socket
+import asyncio
+import tempfile
+import threading
+import subprocess
+
+import aiohttp
+from dotenv import load_dotenv
+
+from tracing import span
+
+load_dotenv()
+
+CONVERTER_BACKEND = os.getenv("CONVERTER_BACKEND", "gotenberg").strip().lower()
+
+GOTENBERG_RETRY_DELAY = float(os.getenv("GOTENBERG_RETRY_DELAY", "3"))
+GOTENBERG_TIMEOUT = float(os.getenv("GOTENBERG_TIMEOUT", "300"))
+GOTENBERG_CHUNK_SIZE = int(os.getenv("GOTENBERG_CHUNK_SIZE", str(256 * 1024)))
+GOTENBERG_COOLDOWN = float(os.getenv("GOTENBERG_COOLDOWN", "30"))
+GOTENBERG_CONVERT_PATH = "/forms/libreoffice/convert"
+
+LIBREOFFICE_POOL_SIZE = int(os.getenv("LIBREOFFICE_POOL_SIZE", "2"))
+LIBREOFFICE_MAX_CONVERSIONS = int(os.getenv("LIBREOFFICE_MAX_CONVERSIONS", "100"))
+LIBREOFFICE_TIMEOUT = float(os.getenv("LIBREOFFICE_TIMEOUT", "180"))
+LIBREOFFICE_START_TIMEOUT = float(os.getenv("LIBREOFFICE_START_TIMEOUT", "60"))
+LIBREOFFICE_SERVER_CMD = os.getenv(
+    "LIBREOFFICE_SERVER_CMD",
+    "unoserver --interface 127.0.0.1 --port {port} --uno-port {uno_port} --user-installation {profile_url}",
+)
+LIBREOFFICE_CONVERT_CMD = os.getenv(
+    "LIBREOFFICE_CONVERT_CMD",
+    "unoconvert --host 127.0.0.1 --port {port} --convert-to pdf {input} {output}",
+)
+
+
+class ConverterBackend:
+    """Интерфейс бэкенда: файл на диске -> PDF на диске"""
+
+    name = ""
+
+    async def convert(self, file_path: str, output_path: str, session: aiohttp.ClientSession, attempts: int) -> str:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def gotenberg_urls() -> list[str]:
+    raw = os.getenv("GOTENBERG_URLS") or os.getenv("GOTENBERG_URL") or ""
+    return [u.strip().rstrip("/") for u in raw.split(",") if u.strip()]
+
+
+class _GotenbergInstance:
+    def __init__(self, url: str):
+        self.url = url
+        self.in_flight = 0
+        self.down_until = 0.0
+
+
+class GotenbergBackend(ConverterBackend):
+    name = "gotenberg"
+
+    def __init__(self, urls: list[str] = None):
+        urls = urls or gotenberg_urls()
+        if not urls:
+            raise ValueError("Переменная GOTENBERG_URL (или GOTENBERG_URLS) не задана в .env файле")
+        self.instances = [_GotenbergInstance(url + GOTENBERG_CONVERT_PATH) for url in urls]
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _pick(self, exclude: set[str]) -> _GotenbergInstance:
+        """Наименее загруженный из живых; при равенстве — по кругу"""
+        with self._lock:
+            now = time.time()
+            n = len(self.instances)
+            order = [self.instances[(self._next + i) % n] for i in range(n)]
+            self._next = (self._next + 1) % n
+            candidates = [i for i in order if i.down_until <= now and i.url not in exclude]
+            # все упали или уже пробовали — берём любой, лишь бы не тот же
+            candidates = candidates or [i for i in order if i.url not in exclude] or order
+            inst = min(candidates, key=lambda i: i.in_flight)
+            inst.in_flight += 1
+            return inst
+
+    def _release(self, inst: _GotenbergInstance, healthy: bool):
+        with self._lock:
+            inst.in_flight -= 1
+            inst.down_until = 0.0 if healthy else time.time() + GOTENBERG_COOLDOWN
+
+    async def convert(self, file_path: str, output_path: str, session: aiohttp.ClientSession, attempts: int) -> str:
+        filename = os.path.basename(file_path)
+        size = os.path.getsize(file_path)
+        last_error = None
+        tried = set()
+
+        for attempt in range(attempts):
+            if attempt:
+                await asyncio.sleep(GOTENBERG_RETRY_DELAY)
+
+            inst = self._pick(tried)
+            tried.add(inst.url)
+            # отмена задачи или 4xx (плохой файл) инстанс из ротации не выводят
+            healthy = True
+            with span("gotenberg.request", attempt=attempt, filename=filename, bytes_in=size, url=inst.url) as sp:
+                try:
+                    # файл открывается заново на каждую попытку: aiohttp читает его по 64 КБ
+                    with open(file_path, 'rb') as f:
+                        form = aiohttp.FormData()
+                        form.add_field('files', f, filename=filename, content_type='application/octet-stream')
+
+                        async with session.post(
+                            inst.url,
+                            data=form,
+                            timeout=aiohttp.ClientTimeout(total=GOTENBERG_TIMEOUT),
+                        ) as response:
+                            if sp is not None:
+                                sp["attrs"]["status"] = response.status
+                            if response.status == 200:
+                                bytes_out = await stream_to_file(response, output_path)
+                                if sp is not None:
+                                    sp["attrs"]["bytes_out"] = bytes_out
+                                return output_path
+
+                            error_text = (await response.content.read(2000)).decode("utf-8", errors="replace")
+                            last_error = f"{response.status} — {error_text}"
+                            healthy = response.status < 500
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    last_error = f"{type(e).__name__}: {e}"
+                    healthy = False
+                finally:
+                    self._release(inst, healthy)
+
+                if sp is not None:
+                    sp["status"] = "error"
+                    sp["error"] = last_error
+
+        raise Exception(f"Gotenberg вернул ошибку: {last_error}")
+
+
+async def stream_to_file(response: aiohttp.ClientResponse, output_path: str) -> int:
+    """Тело ответа -> файл по частям (через .part, чтобы не оставить обрезанный PDF)"""
+    tmp_path = output_path + '.part'
+    written = 0
+    try:
+        with open(tmp_path, 'wb') as out_file:
+            async for chunk in response.content.iter_chunked(GOTENBERG_CHUNK_SIZE):
+                out_file.write(chunk)
+                written += len(chunk)
+    except BaseException:
+        _remove_quietly(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+    return written
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _port_open(port: int) -> bool:
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), 0.5)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+
+class _OfficeSlot:
+    """Один unoserver (= один процесс soffice) со своим профилем"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.proc: subprocess.Popen | None = None
+        self.port = None
+        self.profile_dir = tempfile.mkdtemp(prefix=f"lo_profile_{index}_")
+        self.conversions = 0
+        self.busy = False
+
+    async def healthy(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None and await _port_open(self.port)
+
+    async def start(self):
+        # stop() ждёт завершения процесса — не в event loop
+        await asyncio.to_thread(self.stop)
+        self.port = _free_port()
+        cmd = LIBREOFFICE_SERVER_CMD.format(
+            port=self.port,
+            uno_port=_free_port(),
+            profile_url=f"file://{self.profile_dir}",
+        )
+        try:
+            self.proc = subprocess.Popen(
+                shlex.split(cmd), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+            )
+        except OSError as e:
+            raise RuntimeError(f"LibreOffice не запустился: {cmd}: {e}")
+        self.conversions = 0
+
+        deadline = time.monotonic() + LIBREOFFICE_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"LibreOffice не запустился: {cmd} (код {self.proc.returncode})")
+            if await _port_open(self.port):
+                return
+            await asyncio.sleep(0.2)
+        await asyncio.to_thread(self.stop)
+        raise RuntimeError(f"LibreOffice не поднялся за {LIBREOFFICE_START_TIMEOUT} с")
+
+    def stop(self):
+        if self.proc is None:
+            return
+        # soffice — дочерний процесс unoserver: гасим всю группу
+        try:
+            os.killpg(self.proc.pid, 15)
+            self.proc.wait(timeout=10)
+        except (ProcessLookupError, subprocess.TimeoutExpired):
+            try:
+                os.killpg(self.proc.pid, 9)
+            except ProcessLookupError:
+                pass
+            self.proc.wait()
+        self.proc = None
+
+
+class LibreOfficePoolBackend(ConverterBackend):
+    name = "libreoffice"
+
+    def __init__(self, size: int = LIBREOFFICE_POOL_SIZE):
+        self.slots = [_OfficeSlot(i) for i in range(size)]
+        self._lock = threading.Lock()
+        self._warm = False
+
+    async def _acquire(self, failed: set[int] = None) -> _OfficeSlot:
+        """Свободный слот; failed — индексы слотов, где офис не поднялся (их берём в последнюю очередь)"""
+        failed = failed if failed is not None else set()
+        if not self._warm:
+            # прогрев всего пула при первой конвертации, а не по слоту на файл;
+            # прогреваемые слоты заняты, чтобы их не запустили второй раз
+            with self._lock:
+                self._warm = True
+                warming = [s for s in self.slots if not s.busy]
+                for s in warming:
+                    s.busy = True
+            await asyncio.gather(*(s.start() for s in warming), return_exceptions=True)
+            for s in warming:
+                s.busy = False
+
+        while True:
+            with self._lock:
+                free = [s for s in self.slots if not s.busy]
+                slot = next((s for s in free if s.index not in failed), free[0] if free else None)
+                if slot is not None:
+                    slot.busy = True
+                    break
+            # пул общий для потоков и event loop'ов процесса — ждём опросом
+            await asyncio.sleep(0.05)
+
+        try:
+            if slot.conversions >= LIBREOFFICE_MAX_CONVERSIONS or not await slot.healthy():
+                await slot.start()
+        except BaseException:
+            slot.busy = False
+            failed.add(slot.index)
+            raise
+        return slot
+
+    async def _convert_once(self, slot: _OfficeSlot, file_path: str, output_path: str):
+        tmp_path = output_path + '.part.pdf'
+        cmd = shlex.split(LIBREOFFICE_CONVERT_CMD.format(port=slot.port, input="{input}", output="{output}"))
+        cmd = [file_path if a == "{input}" else tmp_path if a == "{output}" else a for a in cmd]
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            _, stderr = await asyncio.wait_for(proc.communicate(), LIBREOFFICE_TIMEOUT)
+        except BaseException:
+            # таймаут или отмена задачи: офис мог зависнуть на файле — слот перезапускаем
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            await asyncio.to_thread(slot.stop)
+            _remove_quietly(tmp_path)
+            raise
+        finally:
+            slot.conversions += 1
+
+        if proc.returncode != 0 or not os.path.exists(tmp_path):
+            _remove_quietly(tmp_path)
+            raise RuntimeError(f"unoconvert: код {proc.returncode}: {stderr.decode('utf-8', errors='replace')[:2000]}")
+        os.replace(tmp_path, output_path)
+
+    async def convert(self, file_path: str, output_path: str, session: aiohttp.ClientSession, attempts: int) -> str:
+        filename = os.path.basename(file_path)
+        last_error = None
+        failed_start = set()
+
+        for attempt in range(attempts):
+            with span("libreoffice.convert", attempt=attempt, filename=filename,
+                      bytes_in=os.path.getsize(file_path)) as sp:
+                slot = None
+                try:
+                    # запуск офиса — тоже попытка: не поднялся один слот — пробуем другой
+                    slot = await self._acquire(failed_start)
+                except RuntimeError as e:
+                    last_error = str(e)
+                if slot is not None:
+                    if sp is not None:
+                        sp["attrs"]["slot"] = slot.index
+                    try:
+                        await self._convert_once(slot, file_path, output_path)
+                        if sp is not None:
+                            sp["attrs"]["bytes_out"] = os.path.getsize(output_path)
+                        return output_path
+                    except asyncio.TimeoutError:
+                        last_error = f"таймаут {LIBREOFFICE_TIMEOUT} с"
+                    except RuntimeError as e:
+                        last_error = str(e)
+                    finally:
+                        slot.busy = False
+
+                if sp is not None:
+                    sp["status"] = "error"
+                    sp["error"] = last_error
+
+        raise Exception(f"LibreOffice вернул ошибку: {last_error}")
+
+    def close(self):
+        for slot in self.slots:
+            slot.stop()
+            shutil.rmtree(slot.profile_dir, ignore_errors=True)
+
+
+BACKENDS = {
+    GotenbergBackend.name: GotenbergBackend,
+    LibreOfficePoolBackend.name: LibreOfficePoolBackend,
+}
+
+_backends: dict[tuple[int, str], ConverterBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str = None) -> ConverterBackend:
+    """Бэкенд процесса: счётчики Gotenberg и пул LibreOffice общие для всех задач (заново — после fork)"""
+    name = (name or CONVERTER_BACKEND).strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный CONVERTER_BACKEND: {name} (есть: {', '.join(BACKENDS)})")
+    key = (os.getpid(), name)
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = BACKENDS[name]()
+        return _backends[key]
+
+
+@atexit.register
+def close_backends():
+    with _backends_lock:
+        for (pid, _), backend in list(_backends.items()):
+            if pid == os.getpid():
+                backend.close()
+        _backends.clear()
@@ -0,0 +1,95 @@
+"""
+Дедупликация загрузок и single-flight для задач.
+
+Ключ — sha256 содержимого + параметры, влияющие на результат. Первая загрузка
+захватывает ключ в Redis (SET NX) и становится владельцем; повторные загрузки
+того же файла присоединяются к ней, пока она в очереди или в работе, и сразу
+получают готовый result.docx, если она завершилась. Ключ владельца с ошибкой,
+истёкшей или вытесненной задачи перехватывается новой загрузкой.
+
+Активная задача тоже может быть мертва (воркер убит посреди работы, статус
+так и остался processing). Поэтому владелец считается живым, пока задача
+в работе не дольше DEDUP_STALE_FACTOR средних длительностей (admission),
+а в очереди — не дольше DEDUP_STALE_FACTOR оценок ожидания; но не меньше
+DEDUP_STALE_MIN_SECONDS.
+"""
+import os
+import json
+import time
+import hashlib
+
+from dotenv import load_dotenv
+
+import admission
+from storage import get_job, claim_fingerprint, replace_fingerprint, fingerprint_owner
+
+load_dotenv()
+
+ACTIVE_STATUSES = ("queued", "downloading", "processing")
+DEDUP_STALE_FACTOR = float(os.getenv("DEDUP_STALE_FACTOR", "5"))
+DEDUP_STALE_MIN_SECONDS = float(os.getenv("DEDUP_STALE_MIN_SECONDS", "900"))
+
+
+def fingerprint(content_sha256: str, options: dict) -> str:
+    opts = json.dumps(options, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{content_sha256}|{opts}".encode("utf-8")).hexdigest()
+
+
+def _stale(job: dict) -> bool:
+    """Активная задача висит дольше, чем может идти живая"""
+    if job.get("status") == "processing":
+        since = job.get("started_at") or job.get("created_at")
+        expected = admission.avg_job_seconds()
+    else:
+        since = job.get("created_at")
+        expected = admission.eta_seconds(admission.queue_depth())
+    if not since:
+        return False
+    return time.time() - since > max(DEDUP_STALE_MIN_SECONDS, DEDUP_STALE_FACTOR * expected)
+
+
+def _reusable(job: dict | None) -> bool:
+    if not job:
+        return False
+    if job.get("status") in ACTIVE_STATUSES:
+        return not _stale(job)
+    if job.get("status") == "done":
+        path = job.get("result_docx")
+        return bool(path) and os.path.exists(path)
+    return False
+
+
+def lookup(fp: str) -> dict | None:
+    """Живая задача с этим ключом, без захвата: дубликату не нужна квота"""
+    owner = fingerprint_owner(fp)
+    existing = get_job(owner) if owner else None
+    return existing if _reusable(existing) else None
+
+
+def coalesce(fp: str, job_id: str, attempts: int = 3) -> dict | None:
+    """
+    None — job_id стал владельцем ключа, задачу нужно запускать.
+    Иначе — запись существующей задачи, к которой надо присоединиться.
+    """
+    for _ in range(attempts):
+        owner = claim_fingerprint(fp, job_id)
+        if owner is None:
+            return None
+
+        existing = get_job(owner) if owner else None
+        if _reusable(existing):
+            return existing
+
+        # владелец упал / истёк / вытеснен — забираем ключ себе
+        if replace_fingerprint(fp, owner, job_id):
+            return None
+
+    # ключ всё время меняется — обрабатываем без дедупликации
+    return None
+
+
+def release(job: dict):
+    """Освобождает ключ задачи (после ошибки или отмены), если она всё ещё владелец"""
+    fp = job.get("fingerprint")
+    if fp:
+        replace_fingerprint(fp, job["job_id"], None)
@@ -5,6 +5,7 @@ from datetime import datetime
 
 from pdf_extract import pdf_to_pages_text
 from local_openai import ask_openai_async
+from routing import route_slide, template_html
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 WORKDIR = os.getenv("WORKDIR", os.path.join(BASE_DIR, "workdir"))
@@ -41,11 +42,11 @@ PROMPT_TEMPLATE = """
 def extract_html_from_response(resp: dict) -> str:
     return resp["output"][0]["content"][0]["text"]
 
-async def call_llm_with_retry(prompt: str, temperature: float = 0.3, attempts: int = 2) -> str:
+async def call_llm_with_retry(prompt: str, temperature: float = 0.3, attempts: int = 2, model: str = None) -> str:
     last_err = None
     for attempt in range(1, attempts + 1):
         try:
-            resp = await ask_openai_async(prompt, temperature=temperature)
+            resp = await ask_openai_async(prompt, temperature=temperature, model=model)
             return extract_html_from_response(resp)
         except Exception as e:
             last_err = e
@@ -66,20 +67,25 @@ async def main():
 
         cleaned = cleaned[:7000]
 
-        prompt = PROMPT_TEMPLATE.format(
-            rules=SYSTEM_RULES,
-            slide_text=cleaned
-        )
+        route = route_slide(slide_text)
+        if route.kind == "template":
+            html = template_html(slide_text)
+        else:
+            prompt = PROMPT_TEMPLATE.format(
+                rules=SYSTEM_RULES,
+                slide_text=cleaned
+            )
 
-        html = await call_llm_with_retry(prompt, temperature=0.3, attempts=2)
+            html = await call_llm_with_retry(prompt, temperature=0.3, attempts=2, model=route.model)
 
         results.append({
             "slide": i,
             "generated_html": html,
-            "source_text_preview": cleaned[:500]
+            "source_text_preview": cleaned[:500],
+            "route": route.to_dict(),
         })
 
-        print(f"OK slide {i}/{total}")
+        print(f"OK slide {i}/{total} ({route.kind})")
 
     html_path = os.path.join(WORKDIR, "slides_report.html")
     with open(html_path, "w", encoding="utf-8") as f:
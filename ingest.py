@@ -0,0 +1,164 @@
+"""
+Параллельная загрузка презентаций из S3 (Yandex Object Storage / MinIO / любой S3).
+
+Скачивание идёт потоково на диск (get_object + iter_chunks) через общий
+пул соединений boto3, не больше INGEST_DOWNLOAD_CONCURRENCY файлов сразу.
+Конвертация в PDF начинается, как только файл скачан, и идёт параллельно
+с остальными загрузками (не больше INGEST_CONVERT_CONCURRENCY сразу).
+
+Для локальной проверки: minio из docker-compose.yml и
+S3_ENDPOINT_URL=http://localhost:9000.
+"""
+import os
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+from dotenv import load_dotenv
+
+from tracing import job_trace, span
+
+if TYPE_CHECKING:
+    import aiohttp
+
+load_dotenv()
+
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "https://storage.yandexcloud.net")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "")
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+
+S3_MAX_POOL = int(os.getenv("S3_MAX_POOL", "32"))
+S3_CHUNK_SIZE = int(os.getenv("S3_CHUNK_SIZE", str(1024 * 1024)))
+INGEST_DOWNLOAD_CONCURRENCY = int(os.getenv("INGEST_DOWNLOAD_CONCURRENCY", "8"))
+INGEST_CONVERT_CONCURRENCY = int(os.getenv("INGEST_CONVERT_CONCURRENCY", "4"))
+
+_clients: dict[tuple, object] = {}
+_clients_lock = threading.Lock()
+
+
+def get_s3_client(access_key: str = None, secret_key: str = None, endpoint_url: str = None):
+    """
+    Общий клиент boto3 на процесс (потокобезопасен, держит пул соединений).
+    Кэшируется по (pid, ключ, endpoint), чтобы не тащить сокеты через fork.
+    """
+    import boto3
+    from botocore.config import Config
+
+    access_key = access_key or S3_ACCESS_KEY
+    secret_key = secret_key or S3_SECRET_KEY
+    endpoint_url = endpoint_url or S3_ENDPOINT_URL
+    cache_key = (os.getpid(), access_key, endpoint_url)
+
+    with _clients_lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            client = boto3.client(
+                "s3",
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name=S3_REGION,
+                endpoint_url=endpoint_url,
+                config=Config(signature_version="s3v4", max_pool_connections=S3_MAX_POOL),
+            )
+            _clients[cache_key] = client
+        return client
+
+
+def normalize_key(s3_key: str) -> str:
+    """Ключи приходят с CDN-префиксом: cdn/<key>"""
+    return s3_key.replace("cdn/", "", 1)
+
+
+def download_to_file(client, bucket: str, key: str, dest_path: str) -> int:
+    """Потоково скачивает объект в файл (через .part), возвращает размер"""
+    tmp_path = dest_path + ".part"
+    size = 0
+    response = client.get_object(Bucket=bucket, Key=key)
+    body = response["Body"]
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in body.iter_chunks(S3_CHUNK_SIZE):
+                f.write(chunk)
+                size += len(chunk)
+    finally:
+        body.close()
+    os.replace(tmp_path, dest_path)
+    return size
+
+
+@dataclass
+class IngestItem:
+    key: str
+    dest_dir: str
+    job_id: str | None = None
+    local_path: str | None = None
+    pdf_path: str | None = None
+    size: int = 0
+    error: str | None = None
+    spans: list[dict] = field(default_factory=list)
+
+    @property
+    def filename(self) -> str:
+        return normalize_key(self.key).split("/")[-1]
+
+
+async def ingest(
+    items: list[IngestItem],
+    bucket: str,
+    session: "aiohttp.ClientSession",
+    client=None,
+    on_ready: Callable[[IngestItem], Awaitable] = None,
+    download_concurrency: int = INGEST_DOWNLOAD_CONCURRENCY,
+    convert_concurrency: int = INGEST_CONVERT_CONCURRENCY,
+) -> list[IngestItem]:
+    """
+    Скачивает и конвертирует items. Ошибка одного файла не останавливает
+    остальные — она пишется в item.error. on_ready вызывается для каждого
+    элемента сразу по готовности (успех или ошибка).
+    """
+    from presentationconverter import PresentationConverter
+    from pipeline import convert_to_pdf_if_needed
+
+    client = client or get_s3_client()
+    # без GOTENBERG_URL можно грузить PDF, конвертер нужен только презентациям
+    needs_converter = any(not item.filename.lower().endswith(".pdf") for item in items)
+    converter = PresentationConverter() if needs_converter else None
+    download_sem = asyncio.Semaphore(download_concurrency)
+    convert_sem = asyncio.Semaphore(convert_concurrency)
+
+    async def handle(item: IngestItem):
+        # у каждого элемента свой трейс: спаны потом дописываются к трейсу задачи
+        with job_trace(item.job_id or item.key) as tracer:
+            try:
+                with span("ingest", key=item.key):
+                    await _download_and_convert(item)
+            except Exception as e:
+                item.error = str(e)
+        item.spans = tracer.spans
+
+        if on_ready is not None:
+            await on_ready(item)
+
+    async def _download_and_convert(item: IngestItem):
+        ext = item.filename.lower().rsplit(".", 1)[-1]
+        if ext != "pdf" and ext not in PresentationConverter.SUPPORTED_EXTENSIONS:
+            raise RuntimeError(f"Неверный формат: {item.filename}")
+
+        os.makedirs(item.dest_dir, exist_ok=True)
+        item.local_path = os.path.join(item.dest_dir, item.filename)
+        async with download_sem:
+            with span("s3.download", key=item.key) as sp:
+                item.size = await asyncio.to_thread(
+                    download_to_file, client, bucket, normalize_key(item.key), item.local_path
+                )
+                if sp is not None:
+                    sp["attrs"]["bytes"] = item.size
+
+        async with convert_sem:
+            item.pdf_path = await convert_to_pdf_if_needed(item.local_path, session, converter)
+
+    await asyncio.gather(*(handle(item) for item in items))
+    return items
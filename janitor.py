@@ -0,0 +1,143 @@
+"""
+Уборка WORKDIR.
+
+1. Сверка с Redis: каталоги задач без записи (запись истекла по JOB_TTL)
+   удаляются целиком. Каталоги задач с ошибкой или отменённых (в них остаётся
+   профиль для разбора) хранятся JANITOR_DEAD_RETENTION_SECONDS после
+   завершения.
+2. Квота: если WORKDIR больше DISK_QUOTA_BYTES, сначала удаляются хранимые
+   каталоги упавших задач, затем результаты готовых вытесняются по LRU
+   (давно не скачивали — первыми) до DISK_QUOTA_LOW_WATER от квоты.
+   Запись готовой задачи остаётся со статусом "evicted".
+
+Запускается периодически из Celery beat (tasks.janitor_sweep) или вручную:
+    python janitor.py [--dry-run]
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+from dotenv import load_dotenv
+
+from storage import get_job, set_job, result_access_times, forget_result, acquire_lock, release_lock
+from workdir import WORKDIR, iter_job_dirs, dir_size
+from celery_app import JANITOR_INTERVAL
+
+load_dotenv()
+
+DISK_QUOTA_BYTES = int(os.getenv("DISK_QUOTA_BYTES", str(20 * 1024 ** 3)))
+DISK_QUOTA_LOW_WATER = float(os.getenv("DISK_QUOTA_LOW_WATER", "0.9"))
+# свежие каталоги не трогаем: API создаёт каталог раньше записи в Redis
+JANITOR_GRACE_SECONDS = int(os.getenv("JANITOR_GRACE_SECONDS", "600"))
+# сколько хранить каталог упавшей/отменённой задачи (профиль, трейс — для разбора)
+JANITOR_DEAD_RETENTION_SECONDS = int(os.getenv("JANITOR_DEAD_RETENTION_SECONDS", "86400"))
+
+DEAD_STATUSES = ("error", "cancelled")
+
+
+def _remove(path: str, dry_run: bool):
+    if not dry_run:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def sweep(dry_run: bool = False, now: float = None) -> dict:
+    now = now or time.time()
+    stats = {
+        "dirs": 0,
+        "orphans_removed": 0,
+        "failed_removed": 0,
+        "evicted": 0,
+        "bytes_freed": 0,
+        "bytes_total": 0,
+        "quota": DISK_QUOTA_BYTES,
+        "dry_run": dry_run,
+    }
+
+    done = []  # (job_id, path, size, job)
+    dead = []  # (finished_at, path, size)
+    for job_id, path in iter_job_dirs():
+        stats["dirs"] += 1
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            continue
+
+        job = get_job(job_id)
+        size = dir_size(path)
+
+        if job is None:
+            if now - mtime < JANITOR_GRACE_SECONDS:
+                stats["bytes_total"] += size
+                continue
+            _remove(path, dry_run)
+            stats["orphans_removed"] += 1
+            stats["bytes_freed"] += size
+            continue
+
+        status = job.get("status")
+        if status in DEAD_STATUSES:
+            finished = job.get("finished_at") or job.get("cancelled_at") or mtime
+            if now - finished >= JANITOR_DEAD_RETENTION_SECONDS:
+                _remove(path, dry_run)
+                stats["failed_removed"] += 1
+                stats["bytes_freed"] += size
+                continue
+            dead.append((finished, path, size))
+
+        stats["bytes_total"] += size
+        if status == "done":
+            done.append((job_id, path, size, job))
+
+    access = result_access_times()
+    live = {d[0] for d in done}
+    if not dry_run:
+        # LRU-отметки удалённых и истёкших задач
+        for job_id in access.keys() - live:
+            forget_result(job_id)
+
+    if stats["bytes_total"] > DISK_QUOTA_BYTES:
+        target = DISK_QUOTA_BYTES * DISK_QUOTA_LOW_WATER
+        # хранимые для разбора каталоги отдаём раньше результатов
+        for finished, path, size in sorted(dead):
+            if stats["bytes_total"] <= target:
+                break
+            _remove(path, dry_run)
+            stats["failed_removed"] += 1
+            stats["bytes_freed"] += size
+            stats["bytes_total"] -= size
+
+        # без отметки обращения — по времени завершения
+        done.sort(key=lambda d: access.get(d[0], d[3].get("finished_at", 0)))
+        for job_id, path, size, job in done:
+            if stats["bytes_total"] <= target:
+                break
+            _remove(path, dry_run)
+            if not dry_run:
+                forget_result(job_id)
+                set_job(job_id, {**job, "status": "evicted", "evicted_at": now})
+            stats["evicted"] += 1
+            stats["bytes_freed"] += size
+            stats["bytes_total"] -= size
+
+    return stats
+
+
+def sweep_once(dry_run: bool = False) -> dict | None:
+    """sweep() под Redis-локом: одновременно работает только один уборщик"""
+    token = acquire_lock("janitor", JANITOR_INTERVAL * 2)
+    if token is None:
+        return None
+    try:
+        return sweep(dry_run=dry_run)
+    finally:
+        release_lock("janitor", token)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Уборка WORKDIR")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать, ничего не удалять")
+    args = parser.parse_args()
+
+    print("WORKDIR:", WORKDIR)
+    print(json.dumps(sweep_once(dry_run=args.dry_run), indent=2))
@@ -2,9 +2,8 @@ import os
 from dotenv import load_dotenv
 import aiohttp
 import asyncio
-import boto3
-from botocore.config import Config
-import presentationconverter
+from tracing import span
+from usage import parse_usage
 
 
 load_dotenv()
@@ -29,7 +28,7 @@ def _ds_headers() -> dict:
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
     }
-def _wrap_like_openai_responses(text: str) -> dict:
+def _wrap_like_openai_responses(text: str, usage: dict | None = None) -> dict:
     return {
         "output": [
             {
@@ -38,7 +37,8 @@ def _wrap_like_openai_responses(text: str) -> dict:
                     {"type": "output_text", "text": text}
                 ],
             }
-        ]
+        ],
+        "usage": usage,
     }
 
 def _openrouter_headers() -> dict:
@@ -52,6 +52,37 @@ def _openrouter_headers() -> dict:
         "X-Title": OPENROUTER_APP_NAME,
     }
 
+async def _post_chat_completion(session: aiohttp.ClientSession, endpoint: str, payload: dict, sp: dict | None) -> dict:
+    async with session.post(
+        endpoint,
+        headers=_openrouter_headers(),
+        json=payload,
+        timeout=aiohttp.ClientTimeout(total=120),
+    ) as response:
+        if sp is not None:
+            sp["attrs"]["status"] = response.status
+
+        raw_text = await response.text()
+        content_type = response.headers.get("Content-Type", "")
+
+        if "application/json" not in content_type.lower():
+            raise RuntimeError(
+                f"OpenRouter вернул НЕ JSON "
+                f"(status={response.status}, type={content_type}). "
+                f"Preview: {raw_text[:400]}"
+            )
+
+        data = await response.json()
+        answer_text = data["choices"][0]["message"]["content"]
+        usage = parse_usage(data, payload["model"])
+        if sp is not None and usage:
+            sp["attrs"].update(
+                prompt_tokens=usage["prompt_tokens"],
+                completion_tokens=usage["completion_tokens"],
+                cost=usage["cost"],
+            )
+        return _wrap_like_openai_responses(answer_text, usage)
+
 async def ask_openai_async(
     prompt,
     temperature,
@@ -61,6 +92,7 @@ async def ask_openai_async(
     local_proxy_key=None,
     input_files=None,
     attempt=0,
+    session=None,
 ):
     if input_files:
         raise NotImplementedError(
@@ -81,32 +113,18 @@ async def ask_openai_async(
             {"role": "user", "content": prompt},
         ],
         "temperature": temperature,
+        # OpenRouter: вернуть в usage фактическую стоимость вызова
+        "usage": {"include": True},
     }
 
     endpoint = f"{OPENROUTER_URL}/chat/completions"
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                endpoint,
-                headers=_openrouter_headers(),
-                json=payload,
-                timeout=aiohttp.ClientTimeout(total=120),
-            ) as response:
-
-                raw_text = await response.text()
-                content_type = response.headers.get("Content-Type", "")
-
-                if "application/json" not in content_type.lower():
-                    raise RuntimeError(
-                        f"OpenRouter вернул НЕ JSON "
-                        f"(status={response.status}, type={content_type}). "
-                        f"Preview: {raw_text[:400]}"
-                    )
-
-                data = await response.json()
-                answer_text = data["choices"][0]["message"]["content"]
-                return _wrap_like_openai_responses(answer_text)
+        with span("llm.request", attempt=attempt, model=payload["model"]) as sp:
+            if session is None:
+                async with aiohttp.ClientSession() as own_session:
+                    return await _post_chat_completion(own_session, endpoint, payload, sp)
+            return await _post_chat_completion(session, endpoint, payload, sp)
 
     except Exception:
         if attempt >= 1:
@@ -121,6 +139,7 @@ async def ask_openai_async(
             local_proxy_key,
             input_files,
             attempt + 1,
+            session=session,
         )
 
 
@@ -128,47 +147,33 @@ async def ask_openai_async(
 
 
 async def upload_files_from_s3_with_conversion(bucket_info, s3_keys, url, local_key, local_proxy_key):
-
+    # скачивание и конвертация идут параллельно (см. ingest.py), boto3 грузится только здесь
+    import tempfile
+    from ingest import IngestItem, ingest, get_s3_client
 
     s3_yandex_key = bucket_info[0]
     s3_yandex_secret = bucket_info[1]
     bucket_name = bucket_info[2]
 
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=s3_yandex_key,
-        aws_secret_access_key=s3_yandex_secret,
-        region_name="us-east-1",
-        endpoint_url="https://storage.yandexcloud.net",
-        config=Config(signature_version="s3v4"),
-    )
+    s3 = get_s3_client(s3_yandex_key, s3_yandex_secret)
 
     results = []
 
-    async with aiohttp.ClientSession(trust_env=USE_TRUST_ENV) as session:
-        for s3_key_item in s3_keys:
-            s3_key = s3_key_item.replace("cdn/", "", 1)
-            s3_response = s3.get_object(Bucket=bucket_name, Key=s3_key)
-            original_file_content = s3_response["Body"].read()
-            original_filename = s3_key.split("/")[-1]
-
-            file_extension = original_filename.lower().split(".")[-1]
-
-            if file_extension == "pdf":
-                results.append({"filename": original_filename, "bytes": original_file_content})
-                continue
-
-            converter = presentationconverter.PresentationConverter()
-            if not converter.is_presentation_memory(file_extension):
-                raise Exception(f"Неверный формат: {original_filename}")
+    with tempfile.TemporaryDirectory(prefix="s3_ingest_") as tmp_dir:
+        items = [
+            IngestItem(key=s3_key_item, dest_dir=os.path.join(tmp_dir, str(i)))
+            for i, s3_key_item in enumerate(s3_keys)
+        ]
 
-            pdf_bytes = await converter.convert_to_pdf_in_memory(
-                original_file_content,
-                original_filename,
-                session,
-            )
+        async with aiohttp.ClientSession(trust_env=USE_TRUST_ENV) as session:
+            await ingest(items, bucket_name, session, client=s3)
 
-            pdf_name = original_filename.rsplit(".", 1)[0] + ".pdf"
+        for item in items:
+            if item.error:
+                raise Exception(item.error)
+            with open(item.pdf_path, "rb") as f:
+                pdf_bytes = f.read()
+            pdf_name = item.filename.rsplit(".", 1)[0] + ".pdf"
             results.append({"filename": pdf_name, "bytes": pdf_bytes})
 
     return results
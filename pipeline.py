@@ -0,0 +1,151 @@
+"""
+Этапы конвейера: презентация -> PDF -> текст слайдов -> HTML по слайдам -> DOCX.
+
+Модуль не зависит от Celery и Redis. Тяжёлые зависимости грузятся при первом
+вызове. CPU-этапы (извлечение текста, сборка DOCX) можно вынести в пул
+процессов, передав run_cpu (см. worker_runtime.AsyncRuntime.run_cpu);
+без него они выполняются в текущем потоке, как раньше.
+"""
+import os
+import json
+import asyncio
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+from tracing import span
+from routing import route_slide, template_html, summarize_routes, slide_routes
+from usage import UsageMeter
+
+if TYPE_CHECKING:
+    import aiohttp
+
+RunCpu = Callable[..., Awaitable]
+
+
+class JobCancelled(Exception):
+    """Задачу отменили (DELETE /jobs/{id}) во время выполнения"""
+
+
+async def run_cancellable(coro, is_cancelled: Callable[[], Awaitable[bool]], interval: float = 1.0):
+    """
+    Выполняет coro, раз в interval секунд спрашивая is_cancelled().
+    При отмене снимает задачу: CancelledError обрывает текущие запросы
+    к Gotenberg/LLM, оставшиеся слайды не обрабатываются -> JobCancelled.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=interval)
+            if done:
+                return task.result()
+            if await is_cancelled():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise JobCancelled()
+    finally:
+        task.cancel()
+
+
+async def call_cpu(run_cpu: RunCpu | None, fn, *args):
+    """fn(*args) через пул процессов, если он задан, иначе прямо здесь"""
+    if run_cpu is None:
+        return fn(*args)
+    return await run_cpu(fn, *args)
+
+
+async def convert_to_pdf_if_needed(input_path: str, session: "aiohttp.ClientSession", converter=None) -> str:
+    from presentationconverter import PresentationConverter
+
+    ext = os.path.splitext(input_path)[1].lower().strip(".")
+    if ext == "pdf":
+        return input_path
+
+    converter = converter or PresentationConverter()
+    if not converter.is_presentation_memory(ext):
+        raise RuntimeError(f"Unsupported input format: .{ext}")
+
+    pdf_path = os.path.splitext(input_path)[0] + ".pdf"
+    with span("convert", ext=ext, backend=converter.backend.name, bytes_in=os.path.getsize(input_path)):
+        await converter.convert_file_to_pdf_async(input_path, pdf_path, session)
+
+    return pdf_path
+
+
+async def generate_slides_json(
+    pdf_path: str,
+    out_json_path: str,
+    session: "aiohttp.ClientSession" = None,
+    run_cpu: RunCpu = None,
+    meter: UsageMeter = None,
+):
+    from pdf_extract import pdf_to_pages_text
+    from generate_report_by_slides import PROMPT_TEMPLATE, SYSTEM_RULES
+    from local_openai import ask_openai_async
+
+    with span("extract") as sp:
+        pages = await call_cpu(run_cpu, pdf_to_pages_text, pdf_path)
+        if sp is not None:
+            sp["attrs"]["pages"] = len(pages)
+    results = []
+
+    for i, slide_text in enumerate(pages, start=1):
+        cleaned = slide_text.strip() or "[Текст со слайда не извлечён. Возможно, слайд-картинка.]"
+        cleaned = cleaned[:7000]
+
+        # пустые слайды и разделители — по шаблону, простые — быстрой моделью
+        route = route_slide(slide_text)
+        usage = None
+        with span("slide", slide=i, chars=len(cleaned), route=route.kind, model=route.model):
+            if route.kind == "template":
+                html = template_html(slide_text)
+            else:
+                prompt = PROMPT_TEMPLATE.format(rules=SYSTEM_RULES, slide_text=cleaned)
+                # 2 попытки
+                resp = await ask_openai_async(prompt, temperature=0.3, model=route.model, session=session)
+                html = resp["output"][0]["content"][0]["text"]
+                usage = resp.get("usage")
+                if meter is not None:
+                    meter.add(usage)
+
+        results.append({"slide": i, "generated_html": html, "route": route.to_dict(), "usage": usage})
+
+    with open(out_json_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    return results
+
+
+async def build_docx(json_path: str, output_path: str, run_cpu: RunCpu = None):
+    from build_docx import build_docx_from_slides
+
+    with span("build_docx"):
+        await call_cpu(run_cpu, build_docx_from_slides, json_path, output_path)
+
+
+async def run_pipeline(
+    input_path: str,
+    out_json: str,
+    out_docx: str,
+    session: "aiohttp.ClientSession",
+    run_cpu: RunCpu = None,
+    meter: UsageMeter = None,
+):
+    """
+    Полный прогон одной презентации; session общая для Gotenberg и LLM.
+    Возвращает сводку для записи задачи. meter копит токены LLM и
+    остаётся у вызывающего, даже если конвейер упал или отменён.
+    """
+    meter = meter if meter is not None else UsageMeter()
+    pdf_path = await convert_to_pdf_if_needed(input_path, session)
+    slides = await generate_slides_json(pdf_path, out_json, session=session, run_cpu=run_cpu, meter=meter)
+    await build_docx(out_json, out_docx, run_cpu=run_cpu)
+    return {
+        "slides": len(slides),
+        "routes": summarize_routes(slides),
+        "slide_routes": slide_routes(slides),
+        "usage": meter.to_dict(),
+        # по слайдам — только вызовы LLM (шаблонные слайды токенов не тратят)
+        "slide_usage": [
+            {"slide": s["slide"], **{k: s["usage"][k] for k in ("model", "prompt_tokens", "completion_tokens", "cost")}}
+            for s in slides if s["usage"]
+        ],
+    }
@@ -1,22 +1,32 @@
 import os
 import mimetypes
-import requests
 from dotenv import load_dotenv
 import aiohttp
 import asyncio
 
+from tracing import span
+from converter_backends import get_backend, gotenberg_urls, GOTENBERG_CONVERT_PATH
+
 load_dotenv()
 
+# попыток конвертации (в Gotenberg — по возможности на разных инстансах)
+CONVERT_ATTEMPTS = int(os.getenv("CONVERT_ATTEMPTS", os.getenv("GOTENBERG_ATTEMPTS", "3")))
+
 class PresentationConverter:
 
     SUPPORTED_EXTENSIONS = {'ppt', 'pptx', 'odp'}
 
-    def __init__(self):
-        gotenberg_url = os.getenv("GOTENBERG_URL")
-        if not gotenberg_url:
+    def __init__(self, backend: str = None):
+        # backend: gotenberg | libreoffice (по умолчанию CONVERTER_BACKEND), см. converter_backends.py
+        self.backend = get_backend(backend)
+
+        # синхронный и in-memory методы ходят в первый Gotenberg напрямую
+        urls = gotenberg_urls()
+        self.gotenberg_url = urls[0] + GOTENBERG_CONVERT_PATH if urls else None
+
+    def _require_gotenberg(self):
+        if not self.gotenberg_url:
             raise ValueError("Переменная GOTENBERG_URL не задана в .env файле")
-        
-        self.gotenberg_url = gotenberg_url.rstrip('/') + '/forms/libreoffice/convert'
 
 
     def is_presentation(self, file_path: str) -> bool:
@@ -60,6 +70,9 @@ class PresentationConverter:
             raise ValueError(f"Файл {file_path} не является поддерживаемой презентацией "
                              f"({', '.join(self.SUPPORTED_EXTENSIONS)})")
 
+        self._require_gotenberg()
+        import requests
+
         with open(file_path, 'rb') as f:
             files = {
                 'files': (os.path.basename(file_path), f, 'application/octet-stream')
@@ -87,20 +100,38 @@ class PresentationConverter:
         attempt: int = 0
     ) -> bytes:
         """Конвертирует файл в PDF в памяти без сохранения на диск"""
+        self._require_gotenberg()
         await asyncio.sleep(3)
 
         form = aiohttp.FormData()
         form.add_field('files', file_content, filename=filename, content_type='application/octet-stream')
 
-        async with session.post(self.gotenberg_url, data=form) as response:
-            if response.status != 200:
-                error_text = await response.text()
-                if attempt >= 2:
-                    raise Exception(f"Gotenberg вернул ошибку: {response.status} — {error_text}")
+        with span("gotenberg.request", attempt=attempt, filename=filename, bytes_in=len(file_content)) as sp:
+            async with session.post(self.gotenberg_url, data=form) as response:
+                if sp is not None:
+                    sp["attrs"]["status"] = response.status
+                if response.status != 200:
+                    error_text = await response.text()
+                    if sp is not None:
+                        sp["status"] = "error"
+                    if attempt >= 2:
+                        raise Exception(f"Gotenberg вернул ошибку: {response.status} — {error_text}")
                 else:
-                    return await self.convert_to_pdf_in_memory(file_content, filename, session, attempt + 1)
-
-            pdf_content = await response.read()
-            return pdf_content
+                    pdf_content = await response.read()
+                    return pdf_content
 
+        return await self.convert_to_pdf_in_memory(file_content, filename, session, attempt + 1)
 
+    async def convert_file_to_pdf_async(
+        self,
+        file_path: str,
+        output_path: str,
+        session: aiohttp.ClientSession,
+        attempts: int = CONVERT_ATTEMPTS,
+    ) -> str:
+        """
+        Потоковая конвертация через выбранный бэкенд: файл читается с диска,
+        PDF пишется на диск. Память не зависит от размера презентации.
+        Возвращает output_path.
+        """
+        return await self.backend.convert(file_path, output_path, session, attempts)
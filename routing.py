@@ -0,0 +1,152 @@
+"""
+Маршрутизация слайдов по сложности перед вызовом LLM.
+
+Каждый слайд оценивается по извлечённому тексту (длина, число строк,
+списки, доля чисел, «табличность») и получает маршрут:
+    template — пустой слайд / слайд-картинка / разделитель из одной
+               короткой строки без чисел и формул: HTML собирается по
+               шаблону, без вызова LLM;
+    fast     — простой слайд: быстрая дешёвая модель (OPENROUTER_FAST_MODEL);
+    strong   — сложный слайд: основная модель (OPENROUTER_MODEL).
+Решение пишется в каждый слайд (поле "route") и в запись задачи.
+"""
+import os
+import re
+import html
+from dataclasses import dataclass, field, asdict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROUTING_ENABLED = os.getenv("ROUTING_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "tngtech/deepseek-r1t2-chimera:free")
+OPENROUTER_FAST_MODEL = os.getenv("OPENROUTER_FAST_MODEL", OPENROUTER_MODEL)
+
+# одна строка короче этого (без цифр и формул) — разделитель, отвечаем шаблоном
+ROUTE_TEMPLATE_MAX_CHARS = int(os.getenv("ROUTE_TEMPLATE_MAX_CHARS", "80"))
+# от этой оценки сложности слайд уходит основной модели
+ROUTE_STRONG_THRESHOLD = float(os.getenv("ROUTE_STRONG_THRESHOLD", "0.35"))
+
+_BULLET_RE = re.compile(r"^\s*([•\-–—*▪►●]|\d+[.)])\s*")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?%?")
+_WORD_RE = re.compile(r"\w+")
+# цифры, операторы и математические символы: такой слайд не заголовок раздела
+_FORMULA_RE = re.compile(r"[\d=+×÷^√∑∏∫≈≠≤≥±%‰²³¹⁰⁴⁵⁶⁷⁸⁹₀₁₂₃₄₅₆₇₈₉]")
+
+
+@dataclass
+class Route:
+    kind: str               # template | fast | strong
+    model: str | None
+    score: float
+    reason: str
+    features: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def slide_features(text: str) -> dict:
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    words = _WORD_RE.findall(text)
+    numbers = _NUMBER_RE.findall(text)
+    short_numeric_lines = sum(1 for line in lines if len(line) <= 25 and _NUMBER_RE.search(line))
+    return {
+        "chars": len(text.strip()),
+        "lines": len(lines),
+        "words": len(words),
+        "bullets": sum(1 for line in lines if _BULLET_RE.match(line)),
+        "numeric_density": round(len(numbers) / len(words), 3) if words else 0.0,
+        # много коротких строк с числами — похоже на таблицу / статистику
+        "table_like": len(lines) >= 6 and short_numeric_lines >= len(lines) * 0.4,
+    }
+
+
+def complexity_score(features: dict) -> float:
+    """0..1: чем больше, тем сложнее слайд"""
+    score = (
+        0.40 * min(features["chars"] / 1500, 1.0)
+        + 0.20 * min(features["lines"] / 15, 1.0)
+        + 0.20 * min(features["numeric_density"] * 4, 1.0)
+        + 0.10 * min(features["bullets"] / 8, 1.0)
+        + (0.10 if features["table_like"] else 0.0)
+    )
+    return round(score, 3)
+
+
+def is_section_divider(text: str, features: dict) -> bool:
+    """Одна короткая строка без цифр и формул — заголовок раздела"""
+    return (
+        features["lines"] == 1
+        and features["chars"] <= ROUTE_TEMPLATE_MAX_CHARS
+        and not _FORMULA_RE.search(text)
+    )
+
+
+def route_slide(text: str) -> Route:
+    text = (text or "").strip()
+    features = slide_features(text)
+
+    if not ROUTING_ENABLED:
+        return Route("strong", OPENROUTER_MODEL, 1.0, "routing disabled", features)
+
+    if features["words"] == 0:
+        return Route("template", None, 0.0, "no text (image-only slide)", features)
+
+    score = complexity_score(features)
+    if is_section_divider(text, features):
+        return Route("template", None, score, "section divider", features)
+
+    if score >= ROUTE_STRONG_THRESHOLD or features["table_like"]:
+        return Route("strong", OPENROUTER_MODEL, score, "complex slide", features)
+    return Route("fast", OPENROUTER_FAST_MODEL, score, "simple slide", features)
+
+
+def template_html(text: str) -> str:
+    """HTML по структуре PROMPT_TEMPLATE для слайдов без содержательного текста"""
+    lines = [line.strip() for line in (text or "").splitlines() if line.strip()]
+    if not lines:
+        title = "Иллюстрация"
+        theses = ["Слайд содержит изображение без текста."]
+        speech = (
+            "На слайде представлена иллюстрация. Прокомментируйте изображение "
+            "и свяжите его с предыдущим и следующим разделами доклада."
+        )
+    else:
+        title = " ".join(lines)
+        theses = [f"Раздел: {title}"]
+        speech = f"Следующая часть доклада посвящена теме «{title}»."
+
+    title = html.escape(title)
+    parts = [
+        f"<p><strong>Заголовок:</strong> {title}</p>",
+        "<p><strong>Ключевые тезисы:</strong></p>",
+        "<ul>",
+        *(f"<li>{html.escape(t)}</li>" for t in theses),
+        "</ul>",
+        "<p><strong>Текст сопровождения:</strong></p>",
+        f"<p>{html.escape(speech)}</p>",
+        "<p><strong>Источники:</strong></p>",
+        "<ul>",
+        "<li>Источники на слайде не указаны.</li>",
+        "</ul>",
+    ]
+    return "\n".join(parts)
+
+
+def summarize_routes(slides: list[dict]) -> dict:
+    counts = {"template": 0, "fast": 0, "strong": 0}
+    for slide in slides:
+        kind = (slide.get("route") or {}).get("kind", "strong")
+        counts[kind] = counts.get(kind, 0) + 1
+    return counts
+
+
+def slide_routes(slides: list[dict]) -> list[dict]:
+    """Маршрут каждого слайда для записи задачи (slides_report.json после задачи удаляется)"""
+    routes = []
+    for slide in slides:
+        route = slide.get("route") or {}
+        routes.append({"slide": slide["slide"], **{k: route.get(k) for k in ("kind", "model", "score", "reason")}})
+    return routes
@@ -1,5 +1,7 @@
 import os
 import json
+import time
+import uuid
 import redis
 from dotenv import load_dotenv
 
@@ -21,3 +23,172 @@ def set_job(job_id: str, data: dict):
 def get_job(job_id: str) -> dict | None:
     raw = r.get(job_key(job_id))
     return json.loads(raw) if raw else None
+
+def delete_job(job_id: str):
+    r.delete(job_key(job_id), trace_key(job_id), cancel_key(job_id), submitters_key(job_id))
+
+
+def cancel_key(job_id: str) -> str:
+    return f"job:{job_id}:cancel"
+
+def request_cancel(job_id: str):
+    """Флаг отмены отдельно от записи: воркер перезаписывает запись целиком"""
+    r.set(cancel_key(job_id), "1", ex=JOB_TTL)
+
+def is_cancelled(job_id: str) -> bool:
+    return bool(r.exists(cancel_key(job_id)))
+
+
+def submitters_key(job_id: str) -> str:
+    return f"job:{job_id}:submitters"
+
+def add_submitter(job_id: str, client_id: str):
+    """Клиент, ждущий задачу (владелец или присоединившийся через дедупликацию)"""
+    key = submitters_key(job_id)
+    r.sadd(key, client_id)
+    r.expire(key, JOB_TTL)
+
+def remove_submitter(job_id: str, client_id: str) -> int | None:
+    """
+    Клиент отказывается от задачи. Возвращает, сколько клиентов её ещё ждут;
+    None — этот клиент задачу не отправлял
+    """
+    key = submitters_key(job_id)
+    with r.pipeline() as pipe:
+        pipe.exists(key)
+        pipe.srem(key, client_id)
+        pipe.scard(key)
+        existed, removed, remaining = pipe.execute()
+    if not existed:
+        # задача без списка клиентов — отменяет любой
+        return 0
+    return remaining if removed else None
+
+
+def trace_key(job_id: str) -> str:
+    return f"job:{job_id}:trace"
+
+def set_trace(job_id: str, data: dict):
+    key = trace_key(job_id)
+    r.set(key, json.dumps(data, ensure_ascii=False))
+    r.expire(key, JOB_TTL)
+
+def get_trace(job_id: str) -> dict | None:
+    raw = r.get(trace_key(job_id))
+    return json.loads(raw) if raw else None
+
+
+DEDUP_TTL = int(os.getenv("DEDUP_TTL", str(JOB_TTL)))
+
+def dedup_key(fingerprint: str) -> str:
+    return f"dedup:{fingerprint}"
+
+def claim_fingerprint(fingerprint: str, job_id: str) -> str | None:
+    """
+    Single-flight захват (SET NX). None — захватили мы,
+    иначе job_id текущего владельца.
+    """
+    key = dedup_key(fingerprint)
+    if r.set(key, job_id, nx=True, ex=DEDUP_TTL):
+        return None
+    return r.get(key) or ""
+
+def fingerprint_owner(fingerprint: str) -> str | None:
+    return r.get(dedup_key(fingerprint))
+
+def replace_fingerprint(fingerprint: str, expected_job_id: str, job_id: str | None) -> bool:
+    """Compare-and-set владельца (job_id=None — удалить). False, если владелец сменился"""
+    key = dedup_key(fingerprint)
+    with r.pipeline() as pipe:
+        try:
+            pipe.watch(key)
+            if (pipe.get(key) or "") != expected_job_id:
+                pipe.unwatch()
+                return False
+            pipe.multi()
+            if job_id is None:
+                pipe.delete(key)
+            else:
+                pipe.set(key, job_id, ex=DEDUP_TTL)
+            pipe.execute()
+            return True
+        except redis.WatchError:
+            return False
+
+
+RESULTS_LRU_KEY = "results:lru"
+
+def touch_result(job_id: str, ts: float = None):
+    """Отметка последнего обращения к результату (для LRU-вытеснения)"""
+    r.zadd(RESULTS_LRU_KEY, {job_id: ts if ts is not None else time.time()})
+
+def result_access_times() -> dict[str, float]:
+    return dict(r.zrange(RESULTS_LRU_KEY, 0, -1, withscores=True))
+
+def forget_result(job_id: str):
+    r.zrem(RESULTS_LRU_KEY, job_id)
+
+def acquire_lock(name: str, ttl: int) -> str | None:
+    """Токен владельца лока или None, если лок занят"""
+    token = uuid.uuid4().hex
+    return token if r.set(f"lock:{name}", token, nx=True, ex=ttl) else None
+
+def release_lock(name: str, token: str):
+    """Снимает лок, только если он всё ещё наш (истёкший мог взять другой)"""
+    key = f"lock:{name}"
+    with r.pipeline() as pipe:
+        try:
+            pipe.watch(key)
+            if pipe.get(key) != token:
+                pipe.unwatch()
+                return
+            pipe.multi()
+            pipe.delete(key)
+            pipe.execute()
+        except redis.WatchError:
+            pass
+
+
+USAGE_RETENTION_DAYS = int(os.getenv("USAGE_RETENTION_DAYS", "90"))
+
+def usage_day(ts: float = None) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+def _incr_usage(pipe, key: str, usage: dict, ttl: int):
+    for name, value in usage.items():
+        if name == "cost":
+            pipe.hincrbyfloat(key, name, value)
+        else:
+            pipe.hincrby(key, name, value)
+    pipe.expire(key, ttl)
+
+def record_usage(job_usage: dict, client_id: str | None, status: str, slides: int, ts: float = None):
+    """
+    Кластерные счётчики LLM за сутки (UTC): по моделям, по клиентам,
+    число задач по статусам и слайдов. job_usage — UsageMeter.to_dict()
+    """
+    day = usage_day(ts)
+    ttl = USAGE_RETENTION_DAYS * 86400
+    with r.pipeline() as pipe:
+        for model, usage in job_usage["by_model"].items():
+            _incr_usage(pipe, f"usage:{day}:model:{model}", usage, ttl)
+            pipe.sadd(f"usage:{day}:models", model)
+            pipe.expire(f"usage:{day}:models", ttl)
+        if client_id:
+            _incr_usage(pipe, f"usage:{day}:client:{client_id}", job_usage["total"], ttl)
+            pipe.sadd(f"usage:{day}:clients", client_id)
+            pipe.expire(f"usage:{day}:clients", ttl)
+        _incr_usage(pipe, f"usage:{day}:jobs", {f"jobs_{status}": 1, "slides": slides}, ttl)
+        pipe.execute()
+
+def _parse_usage_hash(raw: dict) -> dict:
+    return {k: float(v) if k == "cost" else int(v) for k, v in raw.items()}
+
+def get_usage(day: str) -> dict:
+    """Счётчики одних суток: {"models": {...}, "clients": {...}, "jobs": {...}}"""
+    out = {"models": {}, "clients": {}}
+    for kind, names_key in (("model", "models"), ("client", "clients")):
+        for name in sorted(r.smembers(f"usage:{day}:{names_key}")):
+            out[names_key][name] = _parse_usage_hash(r.hgetall(f"usage:{day}:{kind}:{name}"))
+    out["jobs"] = _parse_usage_hash(r.hgetall(f"usage:{day}:jobs"))
+    return out
@@ -1,120 +1,286 @@
 import os
+import sys
+import time
 import shutil
-import json
-import aiohttp
-from celery import Celery
+from celery.signals import worker_shutdown, worker_process_shutdown
 from dotenv import load_dotenv
 
-from storage import set_job, get_job
+from celery_app import celery, PROCESS_JOB_TASK, INGEST_TASK, JANITOR_TASK
+from storage import set_job, get_job, set_trace, get_trace, touch_result, is_cancelled, record_usage
+from tracing import job_trace, span
+from profiling import SamplingProfiler
+import dedup
+import admission
+from usage import UsageMeter
+from worker_runtime import WORKER_MODE, get_runtime, shutdown_runtime
 
-from presentationconverter import PresentationConverter
-from pdf_extract import pdf_to_pages_text
-from generate_report_by_slides import PROMPT_TEMPLATE, SYSTEM_RULES  
-from local_openai import ask_openai_async
-from build_docx import build_docx_from_slides
+# тяжёлые модули (aiohttp, fitz, python-docx, bs4, boto3) грузятся при первом
+# использовании внутри функций — воркер стартует быстрее
+# (в т.ч. pipeline -> presentationconverter / pdf_extract / build_docx / local_openai)
 
 load_dotenv()
 
-REDIS_URL = (os.getenv("REDIS_URL") or "redis://localhost:6379/0").strip()
-WORKDIR = os.getenv("WORKDIR", "./workdir")
+PROFILE_NAME = "profile.folded"
+# как часто выполняющаяся задача проверяет флаг отмены
+CANCEL_POLL_INTERVAL = float(os.getenv("CANCEL_POLL_INTERVAL", "1"))
 
-celery = Celery(
-    "worker",
-    broker=REDIS_URL,
-    backend=REDIS_URL,
-)
 
-# важно для windows иногда:
-celery.conf.update(
-    task_serializer="json",
-    result_serializer="json",
-    accept_content=["json"],
-)
+def _run_pipeline(runtime, job_id: str, input_path: str, out_json: str, out_docx: str, meter: UsageMeter):
+    import asyncio
+    from pipeline import run_pipeline, run_cancellable
 
+    def cancellable(session, run_cpu=None):
+        # Redis синхронный — проверка флага в потоке, чтобы не блокировать loop
+        return run_cancellable(
+            run_pipeline(input_path, out_json, out_docx, session, run_cpu, meter),
+            lambda: asyncio.to_thread(is_cancelled, job_id),
+            CANCEL_POLL_INTERVAL,
+        )
 
-async def convert_to_pdf_if_needed(input_path: str, session: aiohttp.ClientSession) -> str:
-    ext = os.path.splitext(input_path)[1].lower().strip(".")
-    if ext == "pdf":
-        return input_path
+    if runtime is not None:
+        # async: общий loop процесса, общая сессия, CPU-этапы в пуле процессов
+        return runtime.run(cancellable(runtime.session, runtime.run_cpu))
 
-    converter = PresentationConverter()
-    if not converter.is_presentation_memory(ext):
-        raise RuntimeError(f"Unsupported input format: .{ext}")
+    # prefork: свой event loop и своя сессия на задачу
+    import aiohttp
 
-    with open(input_path, "rb") as f:
-        content = f.read()
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            return await cancellable(session)
 
-    pdf_bytes = await converter.convert_to_pdf_in_memory(content, os.path.basename(input_path), session)
+    return asyncio.run(run())
 
-    pdf_path = os.path.splitext(input_path)[0] + ".pdf"
-    with open(pdf_path, "wb") as f:
-        f.write(pdf_bytes)
 
-    return pdf_path
-
-
-async def generate_slides_json(pdf_path: str, out_json_path: str):
-    pages = pdf_to_pages_text(pdf_path)
-    results = []
-
-    for i, slide_text in enumerate(pages, start=1):
-        cleaned = slide_text.strip() or "[Текст со слайда не извлечён. Возможно, слайд-картинка.]"
-        cleaned = cleaned[:7000]
+def _cleanup_job_dir(job_dir: str, keep: set[str]):
+    if not os.path.isdir(job_dir):
+        return
+    for name in os.listdir(job_dir):
+        p = os.path.join(job_dir, name)
+        if p not in keep:
+            if os.path.isdir(p):
+                shutil.rmtree(p, ignore_errors=True)
+            else:
+                try:
+                    os.remove(p)
+                except:
+                    pass
 
-        prompt = PROMPT_TEMPLATE.format(rules=SYSTEM_RULES, slide_text=cleaned)
 
-        # 2 попытки
-        resp = await ask_openai_async(prompt, temperature=0.3)
-        html = resp["output"][0]["content"][0]["text"]
+def _account_usage(job: dict, meter: UsageMeter, status: str, slides: int = 0) -> dict:
+    """Токены попытки -> кластерные счётчики; возвращает сумму по задаче с учётом прошлых попыток"""
+    record_usage(meter.to_dict(), job.get("client_id"), status, slides)
+    return UsageMeter.from_dict(job.get("usage")).merge(meter).to_dict()
 
-        results.append({"slide": i, "generated_html": html})
 
-    with open(out_json_path, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+def _finish_cancelled(job: dict, meter: UsageMeter):
+    """Отмена во время работы: статус cancelled, каталог задачи удаляется целиком"""
+    # в записи из API есть cancelled_at — берём её, а не локальную копию
+    current = get_job(job["job_id"]) or job
+    set_job(job["job_id"], {
+        **job,
+        **current,
+        "status": "cancelled",
+        "usage": _account_usage(job, meter, "cancelled"),
+        "finished_at": time.time(),
+    })
+    shutil.rmtree(job["job_dir"], ignore_errors=True)
+    dedup.release(job)
+    admission.release(job)
 
 
-@celery.task(bind=True, max_retries=1)
+@celery.task(bind=True, max_retries=1, name=PROCESS_JOB_TASK)
 def process_job(self, job_id: str):
     job = get_job(job_id)
     if not job:
         return
+    # отменили, пока задача стояла в очереди (revoke до воркера не дошёл)
+    # или ждала повторной попытки: статус processing, каталог и квота ещё заняты
+    if is_cancelled(job_id):
+        _finish_cancelled(job, UsageMeter())
+        return
 
     job_dir = job["job_dir"]
     input_path = job["input_path"]
     out_docx = os.path.join(job_dir, "result.docx")
     out_json = os.path.join(job_dir, "slides_report.json")
+    out_profile = os.path.join(job_dir, PROFILE_NAME)
+
+    # спаны прошлой попытки (retry) дополняем, а не затираем
+    trace = get_trace(job_id) or {}
+    # токены этой попытки; прошлые попытки уже в job["usage"]
+    meter = UsageMeter()
+    with job_trace(job_id, trace.get("spans")) as tracer:
+        try:
+            job = {**job, "status": "processing", "started_at": time.time()}
+            set_job(job_id, job)
+
+            runtime = get_runtime() if WORKER_MODE == "async" else None
+            # в async-режиме профилируется поток общего loop (все задачи процесса)
+            profiled_thread = runtime.thread.ident if runtime is not None else None
+
+            profiler = SamplingProfiler(profiled_thread).start() if job.get("profile") else None
+            try:
+                with span("process_job", attempt=self.request.retries, mode=WORKER_MODE, profile=profiler is not None):
+                    summary = _run_pipeline(runtime, job_id, input_path, out_json, out_docx, meter)
+            finally:
+                if profiler is not None:
+                    profiler.stop()
+                    profiler.save(out_profile)
+
+            # DELETE пришёл, пока конвейер доделывал последний этап: клиенту уже
+            # ответили "cancelled" и освободили ключ дедупликации и квоту
+            if is_cancelled(job_id):
+                _finish_cancelled(job, meter)
+                return
+
+            done = {
+                **job,
+                **summary,
+                "status": "done",
+                "result_docx": out_docx,
+                "usage": _account_usage(job, meter, "done", summary["slides"]),
+                "finished_at": time.time(),
+            }
+            if profiler is not None:
+                done["profile_path"] = out_profile
+            set_job(job_id, done)
+            touch_result(job_id)
+            admission.release(job)
+            admission.record_job_seconds(done["finished_at"] - job["started_at"])
+
+            # cleanup: можно оставить docx (и профиль), удалить остальное
+            _cleanup_job_dir(job_dir, keep={out_docx, out_profile})
+
+        except Exception as e:
+            if is_cancelled(job_id):
+                _finish_cancelled(job, meter)
+                return
+            # 2 попытки
+            if self.request.retries < 1:
+                set_job(job_id, {**job, "usage": _account_usage(job, meter, "retry")})
+                raise self.retry(exc=e, countdown=2)
+            set_job(job_id, {
+                **job,
+                "status": "error",
+                "error": str(e),
+                "usage": _account_usage(job, meter, "error"),
+                "finished_at": time.time(),
+            })
+            # загрузку и промежуточные файлы упавшей задачи не храним, профиль — для разбора
+            _cleanup_job_dir(job_dir, keep={out_profile})
+            # повторная загрузка того же файла должна запустить задачу заново
+            dedup.release(job)
+            admission.release(job)
+        finally:
+            set_trace(job_id, tracer.to_dict())
+
+
+def _set_unless_cancelled(job_id: str, job: dict) -> bool:
+    """
+    Пишет запись задачи, если её не отменили. API ставит флаг отмены раньше
+    статуса cancelled, поэтому флаг после записи значит, что мы могли
+    перетереть cancelled, — возвращаем его. False — задача отменена.
+    """
+    if is_cancelled(job_id):
+        return False
+    set_job(job_id, job)
+    if not is_cancelled(job_id):
+        return True
+    current = get_job(job_id) or job
+    if current.get("status") != "cancelled":
+        set_job(job_id, {**current, "status": "cancelled", "cancelled_at": time.time()})
+    return False
+
+
+@celery.task(name=INGEST_TASK)
+def ingest_from_storage(job_ids: list[str], bucket: str):
+    """
+    Источник задач из S3: параллельно скачивает и конвертирует файлы задач,
+    каждую готовую задачу сразу ставит в process_job (уже с PDF на входе).
+    """
+    import asyncio
+    from ingest import IngestItem, ingest
+
+    jobs = {job_id: get_job(job_id) for job_id in job_ids}
+    jobs = {job_id: job for job_id, job in jobs.items() if job and not is_cancelled(job_id)}
+    items = []
+    for job_id, job in list(jobs.items()):
+        job = {**job, "status": "downloading"}
+        if not _set_unless_cancelled(job_id, job):
+            del jobs[job_id]
+            continue
+        jobs[job_id] = job
+        items.append(IngestItem(key=job["source"]["key"], dest_dir=job["job_dir"], job_id=job_id))
+
+    finished = set()
+
+    def _finish(item):
+        job = jobs[item.job_id]
+        set_trace(item.job_id, {"job_id": item.job_id, "spans": item.spans})
+        if item.error:
+            if _set_unless_cancelled(item.job_id, {**job, "status": "error", "error": item.error, "finished_at": time.time()}):
+                admission.release(job)
+            else:
+                shutil.rmtree(job["job_dir"], ignore_errors=True)
+        elif _set_unless_cancelled(item.job_id, {
+            **job,
+            "status": "queued",
+            "filename": item.filename,
+            "original_path": item.local_path,
+            "input_path": item.pdf_path,
+        }):
+            # task_id = job_id: DELETE /jobs/{id} может отозвать задачу из очереди
+            process_job.apply_async(args=[item.job_id], task_id=item.job_id)
+        else:
+            # отменена во время загрузки: статус уже выставил API
+            shutil.rmtree(job["job_dir"], ignore_errors=True)
+        finished.add(item.job_id)
+
+    async def on_ready(item):
+        # Redis и брокер синхронные — не блокируем loop
+        await asyncio.to_thread(_finish, item)
 
     try:
-        set_job(job_id, {**job, "status": "processing"})
+        runtime = get_runtime() if WORKER_MODE == "async" else None
+        if runtime is not None:
+            runtime.run(ingest(items, bucket, runtime.session, on_ready=on_ready))
+            return
+
+        import aiohttp
 
         async def run():
             async with aiohttp.ClientSession() as session:
-                pdf_path = await convert_to_pdf_if_needed(input_path, session)
-            await generate_slides_json(pdf_path, out_json)
-            build_docx_from_slides(out_json, out_docx)
+                await ingest(items, bucket, session, on_ready=on_ready)
 
-        import asyncio
         asyncio.run(run())
+    except Exception as e:
+        # ошибка всей пачки (S3-клиент, бакет, конвертер): задачи не должны
+        # навсегда остаться в downloading и держать квоту клиента
+        for job_id, job in jobs.items():
+            if job_id in finished:
+                continue
+            if _set_unless_cancelled(job_id, {**job, "status": "error", "error": str(e), "finished_at": time.time()}):
+                admission.release(job)
+        raise
 
-        set_job(job_id, {**job, "status": "done", "result_docx": out_docx})
 
-        # cleanup: можно оставить docx, удалить остальное
-        for name in os.listdir(job_dir):
-            p = os.path.join(job_dir, name)
-            if p != out_docx:
-                if os.path.isdir(p):
-                    shutil.rmtree(p, ignore_errors=True)
-                else:
-                    try:
-                        os.remove(p)
-                    except:
-                        pass
+@celery.task(name=JANITOR_TASK)
+def janitor_sweep():
+    import janitor
+
+    return janitor.sweep_once()
+
 
-    except Exception as e:
-        # 2 попытки
-        if self.request.retries < 1:
-            raise self.retry(exc=e, countdown=2)
-        set_job(job_id, {**job, "status": "error", "error": str(e)})
 @celery.task
 def ping():
     return "ping"
+
+
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def _shutdown_runtime(**_):
+    shutdown_runtime()
+    # пул LibreOffice (CONVERTER_BACKEND=libreoffice) — если конвертер загружался
+    backends = sys.modules.get("converter_backends")
+    if backends is not None:
+        backends.close_backends()
@@ -0,0 +1,67 @@
+import os
+
+os.environ["ROUTING_ENABLED"] = "1"
+
+from routing import route_slide, slide_features, complexity_score, template_html, slide_routes
+
+
+def test_empty_slide_goes_to_template():
+    assert route_slide("").kind == "template"
+    assert route_slide("  \n  ").kind == "template"
+
+
+def test_single_short_line_is_divider():
+    route = route_slide("Итоги и выводы")
+    assert route.kind == "template"
+    assert route.model is None
+
+
+def test_short_slides_with_numbers_or_formulas_reach_llm():
+    for text in (
+        "Итоги квартала\nПродажи 1 200 млн ₽\nМаржа 18%",
+        "Рост выручки 45% в 2023 г.\nЦель: 60%",
+        "E = mc²\nЭнергия покоя",
+        "Цель на 2025 год",
+    ):
+        assert route_slide(text).kind != "template", text
+
+
+def test_short_multiline_text_goes_to_fast():
+    assert route_slide("Команда проекта\nАнна — аналитик").kind == "fast"
+
+
+def test_dense_slide_goes_to_strong():
+    text = "\n".join(f"• Пункт {i}: подробное описание процесса и его ограничений" for i in range(20))
+    route = route_slide(text)
+    assert route.kind == "strong"
+    assert route.features["bullets"] == 20
+
+
+def test_table_like_slide_goes_to_strong():
+    text = "Регион\n2022\n2023\nМосква\n120\n145\nКазань\n80\n95"
+    features = slide_features(text)
+    assert features["table_like"]
+    assert route_slide(text).kind == "strong"
+
+
+def test_bullets_raise_score():
+    plain = slide_features("строка\n" * 8)
+    bullets = slide_features("• строка\n" * 8)
+    assert complexity_score(bullets) > complexity_score(plain)
+
+
+def test_template_html_escapes_title():
+    html = template_html("Раздел <2>")
+    assert "Раздел &lt;2&gt;" in html
+    assert "Иллюстрация" in template_html("")
+
+
+def test_slide_routes_keep_decision_per_slide():
+    slides = [
+        {"slide": i, "route": route_slide(text).to_dict()}
+        for i, text in enumerate(("", "Команда проекта\nАнна — аналитик"), start=1)
+    ]
+    routes = slide_routes(slides)
+    assert [r["slide"] for r in routes] == [1, 2]
+    assert [r["kind"] for r in routes] == ["template", "fast"]
+    assert set(routes[0]) == {"slide", "kind", "model", "score", "reason"}
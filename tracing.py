@@ -0,0 +1,83 @@
+"""
+Трейсинг этапов обработки задачи.
+
+Спаны пишутся в текущий трейсер (contextvar), поэтому модули конвейера
+просто оборачивают код в `with span("name", ...)` — без активного трейсера
+это no-op. Трейс хранится в Redis рядом с задачей (storage.set_trace).
+"""
+import time
+import uuid
+import contextlib
+from contextvars import ContextVar
+
+_current_tracer: ContextVar["Tracer | None"] = ContextVar("tracer", default=None)
+_current_span: ContextVar[dict | None] = ContextVar("span", default=None)
+
+
+class Tracer:
+    def __init__(self, job_id: str, spans: list[dict] = None):
+        self.job_id = job_id
+        # спаны предыдущих попыток (retry) сохраняем
+        self.spans: list[dict] = list(spans or [])
+
+    def to_dict(self) -> dict:
+        return {"job_id": self.job_id, "spans": self.spans}
+
+
+def build_tree(spans: list[dict]) -> list[dict]:
+    """Плоский список спанов -> дерево (children), корни в порядке старта"""
+    nodes = {s["id"]: {**s, "children": []} for s in spans}
+    roots = []
+    for s in spans:
+        node = nodes[s["id"]]
+        parent = nodes.get(s.get("parent_id"))
+        if parent is not None:
+            parent["children"].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    """Спан внутри текущего трейсера. Отдаёт dict спана (или None), в attrs можно дописывать"""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    s = {
+        "id": uuid.uuid4().hex[:16],
+        "parent_id": parent["id"] if parent else None,
+        "name": name,
+        "start": time.time(),
+        "end": None,
+        "duration_ms": None,
+        "status": "ok",
+        "attrs": attrs,
+    }
+    tracer.spans.append(s)
+    token = _current_span.set(s)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s["status"] = "error"
+        s["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s["end"] = time.time()
+        s["duration_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        _current_span.reset(token)
+
+
+@contextlib.contextmanager
+def job_trace(job_id: str, spans: list[dict] = None):
+    """Активирует трейсер задачи на время блока"""
+    tracer = Tracer(job_id, spans)
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
@@ -0,0 +1,89 @@
+"""
+Учёт токенов и стоимости вызовов LLM.
+
+Из каждого ответа OpenRouter берётся блок usage (prompt/completion/cached
+токены и cost, если провайдер его вернул). Вызовы суммируются по слайду,
+по задаче (UsageMeter, с разбивкой по моделям) и в кластерные счётчики
+Redis (storage.record_usage, GET /usage).
+
+Если cost в ответе нет, стоимость оценивается по LLM_PRICES — JSON
+{"модель": [цена за 1M входных токенов, цена за 1M выходных], ...}.
+Модуль не зависит от Redis: pipeline использует его напрямую.
+"""
+import os
+import json
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens")
+
+LLM_PRICES = json.loads(os.getenv("LLM_PRICES", "{}") or "{}")
+
+
+def parse_usage(data: dict, model: str) -> dict | None:
+    """usage из ответа chat/completions -> плоский dict (None, если провайдер его не вернул)"""
+    raw = data.get("usage")
+    if not raw:
+        return None
+    usage = {"model": data.get("model") or model}
+    for name in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        usage[name] = int(raw.get(name) or 0)
+    usage["cached_tokens"] = int((raw.get("prompt_tokens_details") or {}).get("cached_tokens") or 0)
+    if not usage["total_tokens"]:
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    usage["cost"] = float(raw["cost"]) if raw.get("cost") is not None else estimate_cost(usage)
+    return usage
+
+
+def estimate_cost(usage: dict) -> float:
+    price = LLM_PRICES.get(usage["model"])
+    if not price:
+        return 0.0
+    prompt_price, completion_price = price
+    return (usage["prompt_tokens"] * prompt_price + usage["completion_tokens"] * completion_price) / 1_000_000
+
+
+def empty_usage() -> dict:
+    return {"calls": 0, **{name: 0 for name in TOKEN_FIELDS}, "cost": 0.0}
+
+
+def add_usage(acc: dict, usage: dict) -> dict:
+    acc["calls"] += usage.get("calls", 1)
+    for name in TOKEN_FIELDS:
+        acc[name] += usage.get(name, 0)
+    acc["cost"] = round(acc["cost"] + usage.get("cost", 0.0), 8)
+    return acc
+
+
+class UsageMeter:
+    """Сумма вызовов LLM одной задачи; переживает ошибку и отмену конвейера"""
+
+    def __init__(self):
+        self.by_model: dict[str, dict] = {}
+
+    @classmethod
+    def from_dict(cls, data: dict | None) -> "UsageMeter":
+        meter = cls()
+        for model, usage in (data or {}).get("by_model", {}).items():
+            meter.by_model[model] = add_usage(empty_usage(), usage)
+        return meter
+
+    def merge(self, other: "UsageMeter") -> "UsageMeter":
+        for model, usage in other.by_model.items():
+            add_usage(self.by_model.setdefault(model, empty_usage()), usage)
+        return self
+
+    def add(self, usage: dict | None):
+        if usage:
+            add_usage(self.by_model.setdefault(usage["model"], empty_usage()), usage)
+
+    def total(self) -> dict:
+        acc = empty_usage()
+        for model_usage in self.by_model.values():
+            add_usage(acc, model_usage)
+        return acc
+
+    def to_dict(self) -> dict:
+        return {"total": self.total(), "by_model": self.by_model}
@@ -0,0 +1,60 @@
+"""
+Раскладка WORKDIR: каталоги задач шардируются по первым символам job_id
+(WORKDIR/3f/3f2a...), чтобы в одном каталоге не копились сотни тысяч записей.
+
+Каталогом задачи считается только каталог с именем-UUID (job_id): чужие
+каталоги в WORKDIR (lost+found, созданные руками) уборщик не трогает.
+"""
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WORKDIR = os.getenv("WORKDIR", "./workdir")
+WORKDIR_SHARD_CHARS = int(os.getenv("WORKDIR_SHARD_CHARS", "2"))
+
+
+def job_dir_for(job_id: str) -> str:
+    if WORKDIR_SHARD_CHARS <= 0:
+        return os.path.join(WORKDIR, job_id)
+    return os.path.join(WORKDIR, job_id[:WORKDIR_SHARD_CHARS], job_id)
+
+
+_JOB_ID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+# шард — префикс job_id; длина любая, чтобы смена WORKDIR_SHARD_CHARS не теряла старые шарды
+_SHARD_RE = re.compile(r"[0-9a-f]{1,8}")
+
+
+def is_job_id(name: str) -> bool:
+    return _JOB_ID_RE.fullmatch(name) is not None
+
+
+def iter_job_dirs():
+    """(job_id, path) всех каталогов задач: шардированных и старых плоских"""
+    if not os.path.isdir(WORKDIR):
+        return
+    with os.scandir(WORKDIR) as top:
+        for entry in top:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            if is_job_id(entry.name):
+                # старая раскладка: WORKDIR/<job_id>
+                yield entry.name, entry.path
+            elif _SHARD_RE.fullmatch(entry.name):
+                with os.scandir(entry.path) as shard:
+                    for sub in shard:
+                        if (sub.is_dir(follow_symlinks=False) and is_job_id(sub.name)
+                                and sub.name.startswith(entry.name)):
+                            yield sub.name, sub.path
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
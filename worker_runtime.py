@@ -0,0 +1,121 @@
+"""
+Async-режим воркера: один постоянный event loop на процесс.
+
+WORKER_MODE=prefork (по умолчанию) — как раньше: каждая задача делает
+asyncio.run() и занимает слот prefork-воркера целиком.
+
+WORKER_MODE=async — задачи Celery отдают корутины в общий loop процесса
+(отдельный поток), поэтому один процесс держит в работе десятки презентаций:
+    WORKER_MODE=async celery -A tasks worker --pool=threads --concurrency=64
+Все задачи процесса делят одну aiohttp-сессию (пул соединений к Gotenberg
+и LLM), а CPU-этапы (извлечение текста, сборка DOCX) уходят в пул процессов,
+чтобы не блокировать loop.
+"""
+import os
+import asyncio
+import threading
+import contextvars
+import multiprocessing
+import concurrent.futures
+
+WORKER_MODE = os.getenv("WORKER_MODE", "prefork").strip().lower()
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", str(os.cpu_count() or 2)))
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+
+
+class AsyncRuntime:
+    def __init__(self, cpu_workers: int = CPU_POOL_SIZE, http_limit: int = HTTP_POOL_LIMIT, cpu_initializer=None):
+        self.cpu_workers = cpu_workers
+        self.http_limit = http_limit
+        # вызывается в каждом процессе пула при старте (например, перенаправить stdout)
+        self.cpu_initializer = cpu_initializer
+        self.pid = os.getpid()
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: threading.Thread | None = None
+        self.session = None
+        self.cpu_pool: concurrent.futures.ProcessPoolExecutor | None = None
+
+    def start(self) -> "AsyncRuntime":
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="async-runtime", daemon=True)
+        self.thread.start()
+
+        # spawn: воркер Celery многопоточный, fork из него небезопасен
+        self.cpu_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.cpu_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.cpu_initializer,
+        )
+        asyncio.run_coroutine_threadsafe(self._open_session(), self.loop).result()
+        return self
+
+    async def _open_session(self):
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit=self.http_limit)
+        self.session = aiohttp.ClientSession(connector=connector)
+
+    async def _close_session(self):
+        if self.session is not None:
+            await self.session.close()
+
+    def submit(self, coro, context: contextvars.Context = None) -> concurrent.futures.Future:
+        """Запускает корутину в loop процесса; context — контекст задачи (трейсер и т.п.)"""
+        fut = concurrent.futures.Future()
+
+        def _start():
+            if context is not None:
+                task = context.run(self.loop.create_task, coro)
+            else:
+                task = self.loop.create_task(coro)
+
+            def _done(t: asyncio.Task):
+                if t.cancelled():
+                    fut.cancel()
+                elif t.exception() is not None:
+                    fut.set_exception(t.exception())
+                else:
+                    fut.set_result(t.result())
+
+            task.add_done_callback(_done)
+
+        self.loop.call_soon_threadsafe(_start)
+        return fut
+
+    def run(self, coro):
+        """Блокирует вызывающий поток (задачу Celery) до результата корутины"""
+        return self.submit(coro, contextvars.copy_context()).result()
+
+    async def run_cpu(self, fn, *args):
+        return await self.loop.run_in_executor(self.cpu_pool, fn, *args)
+
+    def shutdown(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_session(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.cpu_pool.shutdown(wait=True)
+        self.loop = None
+
+
+_runtime: AsyncRuntime | None = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime() -> AsyncRuntime:
+    """Runtime текущего процесса (создаётся при первом вызове, заново — после fork)"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None or _runtime.pid != os.getpid():
+            _runtime = AsyncRuntime().start()
+        return _runtime
+
+
+def shutdown_runtime():
+    global _runtime
+    with _runtime_lock:
+        if _runtime is not None and _runtime.pid == os.getpid():
+            _runtime.shutdown()
+        _runtime = None